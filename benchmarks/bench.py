@@ -0,0 +1,183 @@
+"""
+pyboke 性能测试。
+
+在临时文件夹中生成不同规模的虚拟博客，依次执行以下操作并记录
+耗时、最大内存占用 (peak RSS) 及写入 (新增或修改) 的文件数量。
+写入的文件只统计 output, articles (包括 metadata) 及 blog.toml, 不包括 .boke-cache
+(缓存的文件在使用时会更新 mtime, 计入的话会掩盖 write-if-changed 的效果):
+
+- init: boke init
+- render-cold: 第一次 boke render -all (全部文章都需要渲染)
+- render-noop: 再次 boke render -all (没有任何变化)
+- render-one: 修改一篇文章后 boke render -all
+- render-force: boke render -all -force
+- index-rss: boke render -index (update_index_rss)
+- rename: boke rename
+- delete: boke delete
+
+每个操作都在独立的子进程中执行 (工作目录为临时博客文件夹)，
+与实际使用 boke 命令时一样，包括 Python 启动及 import 的时间。
+
+用法:
+
+    python benchmarks/bench.py --sizes 1000,10000 --json result.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import gen_blog
+
+Src_Path = Path(__file__).resolve().parent.parent.joinpath("src")
+
+Boke_Command = [sys.executable, "-c", "from pyboke.main import cli; cli()"]
+
+
+Counted_Paths = ["output", "articles", "blog.toml"]
+"""统计写入的文件时，只包括博客文件夹中的这些文件夹及文件"""
+
+
+def snapshot(blog_dir: Path) -> dict:
+    """:return: dict(path, (st_mtime_ns, st_size)), 只包括 Counted_Paths"""
+    result = {}
+    for name in Counted_Paths:
+        top = blog_dir.joinpath(name)
+        if top.is_file():
+            st = top.stat()
+            result[str(top)] = (st.st_mtime_ns, st.st_size)
+            continue
+        for root, _, files in os.walk(top):
+            for filename in files:
+                path = os.path.join(root, filename)
+                st = os.stat(path)
+                result[path] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+def files_written(old: dict, new: dict) -> int:
+    return sum(1 for path, stat in new.items() if old.get(path) != stat)
+
+
+def run_boke(blog_dir: Path, args: list, stdin: str = "", installed=False):
+    """
+    在 blog_dir 中执行一个 boke 命令。
+
+    :return: (耗时秒数, peak RSS 的 MiB, returncode)
+             peak RSS 只包括 boke 进程本身，不包括 -jobs 产生的子进程。
+    """
+    env = dict(os.environ)
+    if not installed:
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [str(Src_Path), env.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        Boke_Command + args, cwd=blog_dir, env=env, stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    proc.stdin.write(stdin)
+    proc.stdin.close()
+    stderr = proc.stderr.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        print(stderr, file=sys.stderr)
+    # Linux 中 ru_maxrss 的单位是 KiB, macOS 中是 byte
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return elapsed, rusage.ru_maxrss / divisor, proc.returncode
+
+
+def touch_article(blog_dir: Path, name: str):
+    path = blog_dir.joinpath("articles", f"{name}.md")
+    with path.open("a", encoding="utf-8") as f:
+        f.write("\n修改了一行。\n")
+
+
+def operations(jobs: int):
+    """
+    :return: [(操作名称, boke 参数, stdin, 执行前的准备函数)]
+    """
+    first, renamed = gen_blog.article_name(0), "renamed-article"
+    render_all = ["render", "-all", "-jobs", str(jobs)]
+    return [
+        ("render-cold", render_all, "", None),
+        ("render-noop", render_all, "", None),
+        ("render-one", render_all, "", lambda blog: touch_article(blog, first)),
+        ("render-force", render_all + ["-force"], "", None),
+        ("index-rss", ["render", "-index"], "", None),
+        ("rename", ["rename", f"articles/{first}.md", f"articles/{renamed}.md"], "", None),
+        ("delete", ["delete", f"articles/{renamed}.md"], "y\n", None),
+    ]
+
+
+def bench_size(size: int, jobs: int, seed: int, installed: bool, keep: bool):
+    results = []
+    tmp = tempfile.mkdtemp(prefix=f"boke-bench-{size}-")
+    blog_dir = Path(tmp)
+
+    def record(name, args, stdin=""):
+        before = snapshot(blog_dir)
+        elapsed, rss, code = run_boke(blog_dir, args, stdin, installed)
+        written = files_written(before, snapshot(blog_dir))
+        result = dict(size=size, op=name, seconds=round(elapsed, 3),
+                      peak_rss_mib=round(rss, 1), files_written=written, ok=code == 0)
+        print_row(result)
+        results.append(result)
+
+    record("init", ["init"])
+    gen_blog.fill_blog_config(blog_dir)
+    gen_blog.generate(blog_dir, size, seed)
+
+    for name, args, stdin, prepare in operations(jobs):
+        if prepare:
+            prepare(blog_dir)
+        record(name, args, stdin)
+
+    if keep:
+        print(f"blog kept in {blog_dir}")
+    else:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def print_header():
+    print(f"{'size':>8} {'operation':<14} {'seconds':>9} {'RSS MiB':>8} {'written':>8}")
+
+
+def print_row(r):
+    flag = "" if r["ok"] else "  FAILED"
+    print(f"{r['size']:>8} {r['op']:<14} {r['seconds']:>9.3f} "
+          f"{r['peak_rss_mib']:>8.1f} {r['files_written']:>8}{flag}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pyboke 性能测试")
+    parser.add_argument("--sizes", default="1000",
+                        help="文章数量，用逗号分隔，比如 1000,10000,100000")
+    parser.add_argument("--jobs", type=int, default=1, help="boke render -all -jobs 的值")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="把结果写入 JSON 文件")
+    parser.add_argument("--installed", action="store_true",
+                        help="测试已安装的 pyboke, 而不是本仓库 src 中的代码")
+    parser.add_argument("--keep", action="store_true", help="保留生成的临时博客")
+    args = parser.parse_args()
+
+    results = []
+    print_header()
+    for size in [int(s) for s in args.sizes.split(",")]:
+        results += bench_size(size, args.jobs, args.seed, args.installed, args.keep)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if not all(r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+生成用于性能测试的虚拟博客文章。
+
+- 文章长度不一 (大部分较短，少数很长)
+- 标题有中文、英文、中英混合
+- 部分文章包含图片，并在对应的 toml 中设定替换地址 (pairs)
+- 文章的创建时间分布在多个年份
+
+用法 (需要先在空文件夹中执行 boke init):
+
+    python benchmarks/gen_blog.py path/to/blog -n 1000
+"""
+import argparse
+import random
+from pathlib import Path
+
+CJK_Chars = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动"
+    "同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二"
+    "理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义"
+    "事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解"
+    "问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管"
+)
+
+English_Words = (
+    "python blog static site generator markdown template cache index feed "
+    "performance render article title year note draft theme image link"
+).split()
+
+Paragraph = (
+    "这是一段用于测试的文字，包含中文与 English words, 以及 `code`, **bold** 和 [link](https://example.com)。"
+)
+
+First_Year, Last_Year = 2005, 2024
+
+
+def random_title(rnd: random.Random) -> str:
+    kind = rnd.random()
+    if kind < 0.5:
+        return "".join(rnd.choices(CJK_Chars, k=rnd.randint(4, 20)))
+    if kind < 0.8:
+        return " ".join(rnd.choices(English_Words, k=rnd.randint(2, 8))).capitalize()
+    cjk = "".join(rnd.choices(CJK_Chars, k=rnd.randint(2, 10)))
+    return f"{rnd.choice(English_Words).capitalize()} {cjk}"
+
+
+def random_paragraphs(rnd: random.Random) -> int:
+    """大部分文章较短，少数文章很长 (长尾分布)"""
+    return min(int(rnd.paretovariate(1.2) * 3), 600)
+
+
+def random_images(rnd: random.Random, pairs_ratio: float) -> int:
+    if rnd.random() >= pairs_ratio:
+        return 0
+    if rnd.random() < 0.02:
+        return rnd.randint(100, 300)  # 极少数文章有大量图片
+    return rnd.randint(1, 12)
+
+
+def random_time(rnd: random.Random) -> str:
+    year = rnd.randint(First_Year, Last_Year)
+    return (f"{year}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} "
+            f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}+08:00")
+
+
+def article_markdown(title: str, paragraphs: int, images: list) -> str:
+    lines = [f"# {title}", ""]
+    for i in range(paragraphs):
+        lines.append(Paragraph)
+        lines.append("")
+        if i % 10 == 9:
+            lines.append(f"## 小节 {i // 10}")
+            lines.append("")
+    for i, image in enumerate(images):
+        lines.append(f"![图片{i}]({image})")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def article_toml(title: str, ctime: str, pairs: list) -> str:
+    """
+    预先写入 toml 以便设定 ctime 和 pairs. checksum 留空，
+    因此第一次 boke render -all 时会当作文章内容有变化而渲染全部文章。
+    """
+    pairs_lines = "".join(f"  ['''{old}''', '''{new}'''],\n" for old, new in pairs)
+    return (
+        f"title = '''{title}'''\n"
+        f"author = ''\n"
+        f"ctime = '{ctime}'\n"
+        f"mtime = '{ctime}'\n"
+        f"checksum = ''\n"
+        f"ignored = false\n"
+        f"img_width = ''\n"
+        f"replace = 1\n"
+        f"pairs = [\n{pairs_lines}]\n"
+    )
+
+
+def article_name(index: int) -> str:
+    return f"post-{index:06d}"
+
+
+def generate(blog_dir: Path, count: int, seed: int = 0, pairs_ratio: float = 0.3):
+    """
+    在 blog_dir (已执行过 boke init) 中生成 count 篇文章。
+
+    :return: 生成的 markdown 文件的总字节数
+    """
+    rnd = random.Random(seed)
+    articles = blog_dir.joinpath("articles")
+    metadata = articles.joinpath("metadata")
+    total = 0
+    for i in range(count):
+        name = article_name(i)
+        title = random_title(rnd)
+        images = [f"../output/pics/{name}-{j}.jpg" for j in range(random_images(rnd, pairs_ratio))]
+        pairs = [(image, f"https://img.example.com/{image.rsplit('/', 1)[-1]}") for image in images]
+        md_text = article_markdown(title, random_paragraphs(rnd), images)
+        data = md_text.encode("utf-8")
+        total += len(data)
+        articles.joinpath(f"{name}.md").write_bytes(data)
+        metadata.joinpath(f"{name}.toml").write_text(
+            article_toml(title, random_time(rnd), pairs), encoding="utf-8")
+    return total
+
+
+def fill_blog_config(blog_dir: Path):
+    """填写 blog.toml 中的博客名称、作者、网址 (渲染 RSS 时需要)"""
+    path = blog_dir.joinpath("blog.toml")
+    text = path.read_text(encoding="utf-8")
+    text = text.replace("在此填写博客名称", "Benchmark Blog")
+    text = text.replace("在此填写作者名称", "bench")
+    text = text.replace("在此填写博客网址", "https://example.com")
+    path.write_text(text, encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成用于性能测试的虚拟博客文章")
+    parser.add_argument("blog_dir", type=Path, help="已执行过 boke init 的博客文件夹")
+    parser.add_argument("-n", type=int, default=1000, help="文章数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pairs-ratio", type=float, default=0.3, help="包含图片的文章的比例")
+    args = parser.parse_args()
+    fill_blog_config(args.blog_dir)
+    total = generate(args.blog_dir, args.n, args.seed, args.pairs_ratio)
+    print(f"generated {args.n} articles, {total / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
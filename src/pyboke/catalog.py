@@ -0,0 +1,242 @@
+"""
+articles/metadata 文件夹的汇总索引 (catalog.json)
+
+每篇文章的 toml 文件仍然是可手动编辑的原始数据，catalog.json 只是它们的缓存，
+只有当 toml 文件的 mtime 或大小发生变化时才会重新读取该 toml 文件。
+"""
+import json
+import os
+from dataclasses import asdict
+
+from .model import Article, ArticleConfig, Catalog_Path, Metadata_Folder_Path, TOML_Suffix
+
+# 注意: catalog.py 只能 import model.py
+
+Catalog_Version = 1
+"""catalog.json 的格式版本，版本不一致时会丢弃旧数据重新生成"""
+
+
+def toml_path_from_id(art_id):
+    return Metadata_Folder_Path.joinpath(f"{art_id}{TOML_Suffix}")
+
+
+def file_stat(path):
+    """
+    :return: [st_mtime_ns, st_size], 文件不存在时返回 None
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class Catalog:
+    """
+    entries 是一个 dict(id, entry), 其中 entry 是 dict, 包含:
+    toml_stat: toml 文件的 [st_mtime_ns, st_size]
+    md_stat: markdown 文件的 [st_mtime_ns, st_size] (可能不存在)
+    images: 文章引用的 output/pics 中的图片，详见 images.signatures() (可能不存在)
+    deps: 渲染文章页面时的模板及博客设定的摘要，详见 tmpl_render.article_deps() (可能不存在)
+    summary: 用于 RSS 的文章摘要 [checksum, size, content] (可能不存在)
+    art: ArticleConfig 转换而成的 dict
+
+    pages 是一个 dict(页面文件名, 摘要), 用来判断首页、索引等页面是否需要重新渲染，
+    详见 tmpl_render.page_digest()
+    """
+
+    def __init__(self, entries: dict, pages: dict = None):
+        self.entries = entries
+        self.pages = pages if pages is not None else {}
+        self.changed = False
+        self.errors = []  # sync() 时无法读取的 toml 文件，由调用者显示
+
+    @classmethod
+    def load(cls):
+        """Loads Catalog from Catalog_Path, 文件不存在或已损坏时返回空的 Catalog"""
+        try:
+            data = json.loads(Catalog_Path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return cls({})
+        if data.get("version") != Catalog_Version:
+            return cls({})
+        return cls(data["articles"], data.get("pages", {}))
+
+    def save(self):
+        """只在内容有变化时写入，先写临时文件再改名，避免写到一半被中断。"""
+        if not self.changed:
+            return
+        data = dict(version=Catalog_Version, articles=self.entries, pages=self.pages)
+        temp_path = Catalog_Path.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+            encoding="utf-8",
+        )
+        os.replace(temp_path, Catalog_Path)
+        self.changed = False
+
+    def get(self, art_id):
+        """
+        获取一篇文章的 ArticleConfig, 如果 toml 文件有变化则重新读取。
+
+        :return: ArticleConfig, toml 文件不存在时返回 None
+        """
+        toml_path = toml_path_from_id(art_id)
+        stat = file_stat(toml_path)
+        if stat is None:
+            self.remove(art_id)
+            return None
+        entry = self.entries.get(art_id)
+        if entry is None or entry["toml_stat"] != stat:
+            art_cfg = ArticleConfig.loads(toml_path)
+            self.put(art_id, art_cfg, stat)
+            return art_cfg
+        return ArticleConfig(**entry["art"])
+
+    def put(self, art_id, art_cfg: ArticleConfig, toml_stat=None):
+        """在写入 toml 文件后调用，更新该文章的条目。"""
+        if toml_stat is None:
+            toml_stat = file_stat(toml_path_from_id(art_id))
+        entry = dict(toml_stat=toml_stat, art=asdict(art_cfg))
+        if old_entry := self.entries.get(art_id):
+            # 这些项目与 toml 无关（摘要另有 checksum 验证），可以保留
+            for key in ("md_stat", "summary", "images", "deps"):
+                if key in old_entry:
+                    entry[key] = old_entry[key]
+        self.entries[art_id] = entry
+        self.changed = True
+
+    def set_md_stat(self, art_id, md_stat):
+        """记录 markdown 文件的 stat, 注意会生成新的 entry 而不是修改原 entry"""
+        entry = self.entries.get(art_id)
+        if entry is None or entry.get("md_stat") == md_stat:
+            return
+        self.entries[art_id] = dict(entry, md_stat=md_stat)
+        self.changed = True
+
+    def get_images(self, art_id) -> dict:
+        entry = self.entries.get(art_id)
+        return entry.get("images", {}) if entry else {}
+
+    def set_images(self, art_id, images: dict):
+        entry = self.entries.get(art_id)
+        if entry is None or entry.get("images", {}) == images:
+            return
+        self.entries[art_id] = dict(entry, images=images)
+        self.changed = True
+
+    def get_deps(self, art_id) -> str:
+        entry = self.entries.get(art_id)
+        return entry.get("deps", "") if entry else ""
+
+    def set_deps(self, art_id, deps: str):
+        entry = self.entries.get(art_id)
+        if entry is None or entry.get("deps") == deps:
+            return
+        self.entries[art_id] = dict(entry, deps=deps)
+        self.changed = True
+
+    def get_summary(self, art_id, checksum, size):
+        """
+        :return: 缓存的摘要，如果文章内容或摘要长度有变化则返回 None
+        """
+        entry = self.entries.get(art_id)
+        if entry is None or "summary" not in entry:
+            return None
+        summary_checksum, summary_size, content = entry["summary"]
+        if summary_checksum != checksum or summary_size != size:
+            return None
+        return content
+
+    def set_summary(self, art_id, checksum, size, content):
+        entry = self.entries.get(art_id)
+        if entry is None:
+            return
+        self.entries[art_id] = dict(entry, summary=[checksum, size, content])
+        self.changed = True
+
+    def md_unchanged(self, art_id, md_stat) -> bool:
+        """
+        只根据 stat 判断 markdown 文件及其 toml 文件是否都未变化，不读取文件内容。
+        如果返回 False, 则需要进一步通过 checksum 来判断。
+        """
+        entry = self.entries.get(art_id)
+        if entry is None or md_stat is None:
+            return False
+        return entry.get("md_stat") == md_stat \
+            and entry["toml_stat"] == file_stat(toml_path_from_id(art_id))
+
+    def put_entry(self, art_id, entry: dict):
+        """直接放入一个条目（比如子进程中生成的条目）"""
+        self.entries[art_id] = entry
+        self.changed = True
+
+    def set_page(self, name, digest):
+        if self.pages.get(name) != digest:
+            self.pages[name] = digest
+            self.changed = True
+
+    def remove_page(self, name):
+        if self.pages.pop(name, None) is not None:
+            self.changed = True
+
+    def remove(self, art_id):
+        if self.entries.pop(art_id, None) is not None:
+            self.changed = True
+
+    def rename(self, old_id, new_id):
+        entry = self.entries.pop(old_id, None)
+        if entry is None:
+            return
+        entry["toml_stat"] = file_stat(toml_path_from_id(new_id))
+        self.entries[new_id] = entry
+        self.changed = True
+
+    def sync(self):
+        """
+        对照 metadata 文件夹，重新读取有变化的 toml 文件，删除已不存在的条目。
+        只需要对每个 toml 文件执行一次 stat, 不需要读取未变化的文件。
+        """
+        seen = set()
+        with os.scandir(Metadata_Folder_Path) as it:
+            for item in it:
+                if not item.name.endswith(TOML_Suffix) or not item.is_file():
+                    continue
+                art_id = item.name.removesuffix(TOML_Suffix)
+                seen.add(art_id)
+                st = item.stat()
+                stat = [st.st_mtime_ns, st.st_size]
+                entry = self.entries.get(art_id)
+                if entry is None or entry["toml_stat"] != stat:
+                    try:
+                        art_cfg = ArticleConfig.loads(item.path)
+                    except (ValueError, TypeError) as e:
+                        # 保留原有的条目 (如果有), 不中止其他文章的处理
+                        self.errors.append(f"无法读取 {item.path}: {e}")
+                        continue
+                    self.put(art_id, art_cfg, stat)
+
+        for art_id in self.entries.keys() - seen:
+            self.remove(art_id)
+        return self
+
+    def articles(self) -> list:
+        """
+        返回 Article 列表，详见 tmpl_render.get_all_articles()
+        每次调用时才生成，不缓存，以免与 entries 重复占用内存 (文章很多时)。
+        Article 与 entries 共用字符串，只在渲染期间存在。
+        """
+        return [
+            Article.from_config(art_id, entry["art"]) for art_id, entry in self.entries.items()
+        ]
+
+
+_catalog = None
+
+
+def get_catalog() -> Catalog:
+    """在同一个进程内共用一个 Catalog, 第一次调用时才读取 catalog.json"""
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog.load()
+    return _catalog
@@ -0,0 +1,142 @@
+"""
+预压缩 (blog.toml 中的 precompress)
+
+为 output 中的文本文件 (html, xml, css 等) 生成同名的 .gz 及 .br (需要安装 brotli) 文件，
+供 nginx 的 gzip_static / brotli_static 直接使用，服务器不需要在每次请求时压缩。
+
+- 命令结束时只处理本次命令写入 (即内容有变化) 或删除的文件，由 writer 记录。
+- gzip 头不包含时间，压缩结果只取决于内容，因此内容不变时压缩文件也不会被改写。
+- 压缩在多个线程中进行 (zlib 及 brotli 在压缩时会释放 GIL), 写入文件仍在主线程。
+- 第一次启用、停用或 brotli 的安装状态有变化时，处理 output 中的全部文本文件。
+"""
+import json
+import os
+from pathlib import Path
+
+from . import log, writer
+from .stats import stats
+from .model import BlogConfig, Blog_Config_Path, Output_Folder_Path, Precompress_Path
+
+# 注意: compress.py 只能 import model.py, log.py, stats.py, writer.py
+# 每个命令结束时都会调用 compress_changes(), 因此 gzip 等模块只在需要时才 import
+
+Precompress_Version = 1
+
+Text_Suffixes = (".html", ".xml", ".css", ".js", ".json", ".txt", ".svg")
+
+Compressed_Suffixes = (".gz", ".br")
+
+Min_Size = 256
+"""小于该大小 (byte) 的文件不压缩"""
+
+Gzip_Level = 9
+Brotli_Quality = 11
+
+
+def get_encoders(enabled: bool) -> dict:
+    """:return: dict(压缩文件的后缀, 压缩函数)"""
+    if not enabled:
+        return {}
+    import gzip
+
+    encoders = {".gz": lambda data: gzip.compress(data, Gzip_Level, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders[".br"] = lambda data: brotli.compress(data, quality=Brotli_Quality)
+    return encoders
+
+
+def is_text_output(path) -> bool:
+    path = Path(path)
+    return path.suffix in Text_Suffixes and Output_Folder_Path in path.parents
+
+
+def compress_file(path: Path, encoders: dict):
+    """
+    在线程中执行，只压缩，不写入。
+
+    :return: (path, dict(后缀, 压缩结果)), 文件太小或不需要压缩时 dict 为空
+    """
+    if not encoders:
+        return path, {}
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return path, {}
+    if len(data) < Min_Size:
+        return path, {}
+    return path, {suffix: encode(data) for suffix, encode in encoders.items()}
+
+
+def process(paths: list, encoders: dict) -> int:
+    """
+    为每个文件写入压缩文件，并删除不再需要的压缩文件 (比如原文件已删除或变得太小)。
+
+    :return: 写入的压缩文件的数量
+    """
+    if not paths:
+        return 0
+    from concurrent.futures import ThreadPoolExecutor
+
+    count = 0
+    with stats.phase("compress"), ThreadPoolExecutor() as executor:
+        results = executor.map(compress_file, paths, [encoders] * len(paths))
+        for path, compressed in results:
+            for suffix in Compressed_Suffixes:
+                sibling = path.with_name(path.name + suffix)
+                if suffix in compressed:
+                    count += writer.write_if_changed(sibling, compressed[suffix])
+                elif sibling.exists():
+                    writer.remove(sibling)
+    stats.count("files_compressed", count)
+    return count
+
+
+def all_text_outputs() -> list:
+    result = []
+    for root, _, files in os.walk(Output_Folder_Path):
+        result += [Path(root, name) for name in files if name.endswith(Text_Suffixes)]
+    return result
+
+
+def read_state():
+    try:
+        return json.loads(Precompress_Path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def precompress_enabled() -> bool:
+    try:
+        return BlogConfig.loads().precompress
+    except (FileNotFoundError, ValueError, TypeError):
+        return False  # blog.toml 有错误时，由其他命令报告错误
+
+
+def compress_changes():
+    """
+    在命令结束时 (写入 blog.toml 之后，记录 build 之前) 调用。
+    """
+    if not Blog_Config_Path.exists():
+        return
+    encoders = get_encoders(precompress_enabled())
+    state = dict(version=Precompress_Version, suffixes=sorted(encoders)) if encoders else None
+
+    if state != read_state():
+        # 设定有变化，处理全部文本文件
+        count = process(all_text_outputs(), encoders)
+        if state is None:
+            Precompress_Path.unlink(missing_ok=True)
+        else:
+            Precompress_Path.parent.mkdir(parents=True, exist_ok=True)
+            Precompress_Path.write_text(json.dumps(state), encoding="utf-8")
+        log.info(f"precompress: {', '.join(state['suffixes']) if state else 'off'}, "
+                 f"写入 {count} 个压缩文件", event="precompress", files=count)
+        return
+
+    changed = [Path(p) for p in writer.changes.written | writer.changes.removed
+               if is_text_output(p)]
+    process(changed, encoders)
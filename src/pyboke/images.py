@@ -0,0 +1,268 @@
+"""
+图片缩放 (output/pics)
+
+在 blog.toml 中设置 img_widths (比如 [480, 960]) 并安装 Pillow (pip install pyboke[images]) 后启用:
+
+- output/pics 中的图片按 img_widths 中小于原图宽度的每个宽度缩放，保存为
+  output/pics/resized/{文件名}-{hash}-{宽度}{扩展名}, 其中 hash 由原图内容计算，
+  因此同一个文件名的内容永远不变，可以设置为长期缓存。
+- 原图的 stat, hash 及生成的图片记录在 .boke-cache/images.json,
+  stat 未变化时不读取原图，hash 未变化时不重新缩放。
+  原图被修改或删除、img_widths 有变化时，删除不再使用的缩放图片。
+  有多张图片需要缩放时，使用多个进程 (最多为 CPU 核数) 并行处理。
+- 渲染文章时，引用了 output/pics 中的图片的 <img> 会加上 srcset, 详见 md_render.PairsRenderer.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+from pathlib import Path
+
+from . import log, writer
+from .stats import stats
+from .model import Pics_Folder_Path, Pics_Folder_Name, Resized_Folder_Name, \
+    Resized_Folder_Path, Images_State_Path, Output_Folder_Name
+
+# 注意: images.py 只能 import model.py, log.py, stats.py, writer.py
+# Pillow 只在需要缩放图片时才 import (在子进程中)
+
+Images_Version = 1
+"""images.json 的格式版本，版本不一致时会丢弃旧数据 (已生成的图片仍可继续使用)"""
+
+Image_Suffixes = (".jpg", ".jpeg", ".png", ".webp")
+"""只处理这些格式 (gif 可能是动画，不缩放)"""
+
+Hash_Length = 12
+
+Save_Options = {
+    "JPEG": dict(quality=85, optimize=True, progressive=True),
+    "PNG":  dict(optimize=True),
+    "WEBP": dict(quality=85),
+}
+
+Image_URL_Pattern = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)")
+"""markdown 中的图片地址 ![alt](url)"""
+
+Local_Prefixes = (f"../{Output_Folder_Name}/{Pics_Folder_Name}/", f"{Pics_Folder_Name}/")
+"""markdown 中引用 output/pics 的图片时，地址的前缀"""
+
+_state = None
+"""dict(相对于 output/pics 的路径, dict(stat, hash, widths, width, height, variants))"""
+
+
+def load_state(reload=False) -> dict:
+    """:param reload: 为真时重新读取 images.json (比如 boke serve 运行期间图片可能已被缩放)"""
+    global _state
+    if _state is None or reload:
+        try:
+            data = json.loads(Images_State_Path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            data = {}
+        _state = data["images"] if data.get("version") == Images_Version else {}
+    return _state
+
+
+def save_state(state: dict):
+    global _state
+    _state = state
+    Images_State_Path.parent.mkdir(parents=True, exist_ok=True)
+    data = dict(version=Images_Version, images=state)
+    writer.write_if_changed(
+        Images_State_Path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+
+def file_hash(path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 16):
+            h.update(chunk)
+    return h.hexdigest()[:Hash_Length]
+
+
+def variant_name(rel_path: str, file_hash: str, width: int) -> str:
+    """:return: 缩放后的图片相对于 output/pics/resized 的路径"""
+    path = Path(rel_path)
+    return path.with_name(f"{path.stem}-{file_hash}-{width}{path.suffix}").as_posix()
+
+
+def find_pics():
+    """逐个返回 output/pics 中的图片 (不包括 resized 文件夹) 的 (相对路径, os.stat_result)"""
+    for root, dirs, files in os.walk(Pics_Folder_Path):
+        if Path(root) == Pics_Folder_Path and Resized_Folder_Name in dirs:
+            dirs.remove(Resized_Folder_Name)
+        for name in files:
+            if name.lower().endswith(Image_Suffixes):
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, Pics_Folder_Path).replace(os.sep, "/")
+                yield rel_path, os.stat(path)
+
+
+def resize_image(rel_path: str, file_hash: str, widths: list):
+    """
+    按 widths 中小于原图宽度的每个宽度缩放图片 (在子进程中执行)。
+    生成的图片文件名包含 hash, 因此文件已存在时不需要重新生成。
+
+    :return: (rel_path, err, info, writer 的记录)
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(Pics_Folder_Path.joinpath(rel_path)) as img:
+            fmt = img.format
+            img = ImageOps.exif_transpose(img)
+            width, height = img.size
+            variants = []
+            for w in widths:
+                if w >= width:
+                    break
+                name = variant_name(rel_path, file_hash, w)
+                variants.append([name, w])
+                dst = Resized_Folder_Path.joinpath(name)
+                if dst.exists():
+                    continue
+                resized = img.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+                if fmt == "JPEG" and resized.mode not in ("RGB", "L"):
+                    resized = resized.convert("RGB")
+                buf = io.BytesIO()
+                resized.save(buf, format=fmt, **Save_Options.get(fmt, {}))
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                writer.write_if_changed(dst, buf.getvalue())
+    except (OSError, ValueError) as e:
+        return rel_path, f"无法处理图片 {rel_path}: {e}", None, writer.changes.take()
+
+    info = dict(width=width, height=height, variants=variants)
+    return rel_path, None, info, writer.changes.take()
+
+
+def resize_in_pool(tasks: list):
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = min(len(tasks), os.cpu_count() or 1)
+    options = log.options()
+    with ProcessPoolExecutor(
+            max_workers=jobs, initializer=log.setup,
+            initargs=(options["level"], options["json_output"])
+    ) as executor:
+        yield from executor.map(resize_image, *zip(*tasks))
+
+
+def remove_unused_variants(state: dict):
+    """删除 output/pics/resized 中不属于 state 中任何图片的缩放图片"""
+    current = {name for info in state.values() for name, _ in info.get("variants", [])}
+    for root, _, files in os.walk(Resized_Folder_Path):
+        for name in files:
+            path = Path(root, name)
+            if path.relative_to(Resized_Folder_Path).as_posix() not in current:
+                log.debug(f"DELETE {path}", event="delete", path=str(path))
+                writer.remove(path)
+
+
+def update(widths: list) -> int:
+    """
+    对照 output/pics 文件夹，为新增或内容有变化的图片生成缩放后的图片，
+    并删除不再使用的缩放图片 (原图已删除，或原图的 hash、缩放宽度有变化)。
+
+    :param widths: blog.toml 中的 img_widths, 为空时不做任何处理
+    :return: 缩放的图片数量
+    """
+    if not widths:
+        return 0
+    if importlib.util.find_spec("PIL") is None:
+        log.warning("blog.toml 中设置了 img_widths, 但未安装 Pillow (pip install Pillow)")
+        return 0
+
+    widths = sorted(set(widths))
+    with stats.phase("images"):
+        old_state = load_state()
+        state, tasks = {}, []
+        for rel_path, st in find_pics():
+            stat = [st.st_mtime_ns, st.st_size]
+            info = old_state.get(rel_path)
+            if info and info["widths"] == widths and info["stat"] == stat:
+                state[rel_path] = info
+                continue
+            h = file_hash(Pics_Folder_Path.joinpath(rel_path))
+            if info and info["widths"] == widths and info["hash"] == h:
+                state[rel_path] = dict(info, stat=stat)
+                continue
+            state[rel_path] = dict(stat=stat, hash=h, widths=widths)
+            tasks.append((rel_path, h, widths))
+
+        if len(tasks) > 1:
+            results = resize_in_pool(tasks)
+        else:
+            results = (resize_image(*task) for task in tasks)
+        for rel_path, err, info, changes in log.progress(results, len(tasks), "images"):
+            writer.changes.merge(changes)
+            if err:
+                # 仍然记录其 stat 和 hash, 图片没变化时不再重试
+                log.warning(err, event="image_error", path=rel_path)
+                state[rel_path]["variants"] = []
+                continue
+            state[rel_path].update(info)
+            log.debug(f"resize {rel_path}", event="resize", path=rel_path,
+                      widths=[w for _, w in info["variants"]])
+
+        if tasks or old_state.keys() != state.keys():
+            remove_unused_variants(state)
+
+        save_state(state)
+        stats.count("images_resized", len(tasks))
+        return len(tasks)
+
+
+def local_pic(url: str) -> str:
+    """:return: 如果 url 指向 output/pics 中的文件，返回其相对于 output/pics 的路径，否则返回空字符串"""
+    for prefix in Local_Prefixes:
+        if url.startswith(prefix):
+            return url.removeprefix(prefix)
+    return ""
+
+
+def signature(rel_path: str, enabled: bool) -> str:
+    """
+    :param enabled: 是否启用了图片缩放 (blog.toml 中的 img_widths 不为空)
+    :return: 图片的缩放结果的签名，未缩放的图片的签名为空字符串
+    """
+    info = load_state().get(rel_path) if enabled else None
+    if not info or not info.get("variants"):
+        return ""
+    return f"{info['hash']}-{'-'.join(str(w) for _, w in info['variants'])}"
+
+
+def signatures(md_text: str, enabled: bool) -> dict:
+    """
+    文章引用的 output/pics 中的图片及其签名，渲染文章时记录在 catalog 中，
+    图片的缩放结果有变化 (包括启用、停用缩放) 时，引用该图片的文章需要重新渲染。
+
+    :return: dict(相对于 output/pics 的路径, 签名)
+    """
+    result = {}
+    for url in Image_URL_Pattern.findall(md_text):
+        if rel_path := local_pic(url):
+            result[rel_path] = signature(rel_path, enabled)
+    return result
+
+
+def signatures_changed(recorded: dict, enabled: bool) -> bool:
+    """:param recorded: 上次渲染文章时记录的 signatures()"""
+    return any(signature(rel_path, enabled) != sig for rel_path, sig in recorded.items())
+
+
+def srcset_map(md_text: str) -> dict:
+    """
+    :return: dict(markdown 中的图片地址, [[相对于 output/pics 的路径, 宽度], ...]),
+             包括缩放后的图片及原图，只包括已缩放的图片。
+    """
+    result = {}
+    state = load_state()
+    for url in Image_URL_Pattern.findall(md_text):
+        rel_path = local_pic(url)
+        info = state.get(rel_path) if rel_path else None
+        if info and info.get("variants"):
+            result[url] = [
+                [f"{Resized_Folder_Name}/{name}", w] for name, w in info["variants"]
+            ] + [[rel_path, info["width"]]]
+    return result
@@ -0,0 +1,137 @@
+"""
+程序运行信息的输出 (代替 print)
+
+- 默认只显示新增、更新、删除文章等信息，以及最后的汇总，批量渲染时在终端显示进度条。
+- boke -verbose ... 另外显示每一个写入的文件。
+- boke -q ... 只显示警告和错误。
+- boke -json ... 每条信息输出为一行 JSON, 方便其他程序处理 (不显示进度条)。
+
+输出到 stdout 时不会每条信息都 flush, 在 CI 等非终端环境中可减少系统调用。
+"""
+import json
+import logging
+import sys
+import time
+
+# 注意: log.py 不可 import 本项目的其他模块
+
+logger = logging.getLogger("pyboke")
+
+Progress_Interval = 0.1
+"""进度条的最短刷新间隔 (秒)"""
+
+
+class Handler(logging.Handler):
+    """
+    写入 sys.stdout (每次都重新获取，以便 sys.stdout 被替换时也能正常输出)。
+    如果正在显示进度条，则先清除进度条再输出。
+    """
+
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+            _progress_bar.clear()
+            sys.stdout.write(msg + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = dict(level=record.levelname.lower(), message=record.getMessage())
+        data.update(getattr(record, "fields", {}))
+        return json.dumps(data, ensure_ascii=False)
+
+
+_handler = Handler()
+_json_output = False
+
+
+def setup(level=logging.INFO, json_output=False):
+    global _json_output
+    _json_output = json_output
+    _handler.setFormatter(JsonFormatter() if json_output else logging.Formatter("%(message)s"))
+    logger.setLevel(level)
+
+
+def options() -> dict:
+    """当前的设定，用于在子进程中调用 setup(**options())"""
+    return dict(level=logger.level, json_output=_json_output)
+
+
+def flush():
+    _handler.flush()
+
+
+def debug(msg, **fields):
+    logger.debug(msg, extra=dict(fields=fields))
+
+
+def info(msg, **fields):
+    logger.info(msg, extra=dict(fields=fields))
+
+
+def warning(msg, **fields):
+    logger.warning(msg, extra=dict(fields=fields))
+
+
+def error(msg, **fields):
+    logger.error(msg, extra=dict(fields=fields))
+
+
+class ProgressBar:
+    """显示在 stderr 的单行进度条"""
+
+    def __init__(self):
+        self.visible = False
+        self.last_draw = 0.0
+
+    def clear(self):
+        if self.visible:
+            sys.stderr.write("\r\033[K")
+            sys.stderr.flush()
+            self.visible = False
+
+    def draw(self, label, done, total, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last_draw < Progress_Interval:
+            return
+        self.last_draw = now
+        width = 30
+        filled = width * done // total if total else width
+        bar = "#" * filled + "-" * (width - filled)
+        flush()  # 先输出缓冲中的信息，避免与进度条交错
+        sys.stderr.write(f"\r{label} [{bar}] {done}/{total}")
+        sys.stderr.flush()
+        self.visible = True
+
+
+_progress_bar = ProgressBar()
+
+
+def show_progress() -> bool:
+    return not _json_output and logger.isEnabledFor(logging.INFO) and sys.stderr.isatty()
+
+
+def progress(iterable, total: int, label: str):
+    """逐个返回 iterable 的项目，同时在终端显示进度条 (不适合显示时直接返回)。"""
+    if not show_progress():
+        yield from iterable
+        return
+    done = 0
+    try:
+        for item in iterable:
+            yield item
+            done += 1
+            _progress_bar.draw(label, done, total)
+        _progress_bar.draw(label, done, total, force=True)
+    finally:
+        _progress_bar.clear()
+
+
+logger.addHandler(_handler)
+logger.propagate = False
+setup()
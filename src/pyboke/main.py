@@ -1,4 +1,13 @@
+import time
+
+_import_start = time.perf_counter()
+
+import importlib
+import json
+import logging
+import os
 import shutil
+import sys
 from pathlib import Path
 
 import click
@@ -7,11 +16,33 @@ from . import (
     __version__,
     __package_name__,
     util,
+    log,
+    manifest,
+    search,
+    compress,
 )
+from .catalog import get_catalog
 from .model import BlogConfig, Articles_Folder_Path, Drafts_Folder_Path, \
     Draft_TMPL_Path, ArticleConfig
 from .tmpl_render import render_article, render_rss, render_all_articles, \
-    art_cfg_path_from_md_path, delete_article, preview_article, update_index_rss, get_all_articles
+    art_cfg_path_from_md_path, delete_article, preview_article, update_index_rss, \
+    get_all_articles, flush_blog_config
+
+# 注意: serve, watch 以及 jinja2, mistune 等较重的模块只在需要时才 import,
+# 以便 boke new 等简单的命令能尽快启动。
+
+Startup_Import_Time = time.perf_counter() - _import_start
+"""import pyboke.main (及其依赖) 所用的时间，单位: 秒"""
+
+Lazy_Modules = [
+    "jinja2",
+    "mistune",
+    "pyboke.md_render",
+    "concurrent.futures.process",
+    "pyboke.watch",
+    "pyboke.serve",
+]
+"""只在需要时才 import 的模块"""
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
@@ -21,11 +52,11 @@ def check_initialization(ctx, check_website=False) -> BlogConfig:
     :return: 没有错误时返回 BlogConfig, 出错时直接退出程序。
     """
     if not util.blog_file_folders_exist():
-        print("请先进入博客根目录，或使用 'boke init' 命令新建博客")
+        log.error("请先进入博客根目录，或使用 'boke init' 命令新建博客")
         ctx.exit()
     err, cfg = util.ensure_blog_config(check_website)
     if err:
-        print(err)
+        log.error(err)
         ctx.exit()
     return cfg
 
@@ -52,9 +83,54 @@ def show_info(ctx, _, value):
     print(f"[Theme]   {cfg.current_theme}")
     print(f"[Total]   {util.articles_count()} articles")
     print()
+    flush_blog_config()
     ctx.exit()
 
 
+def profile_startup(ctx, _, value):
+    if not value or ctx.resilient_parsing:
+        return
+    print(f"[startup] import pyboke.main: {Startup_Import_Time*1000:.1f} ms")
+    for name in Lazy_Modules:
+        if name in sys.modules:
+            print(f"[lazy]    {name}: already imported (should be lazy!)")
+            continue
+        start = time.perf_counter()
+        importlib.import_module(name)
+        elapsed = time.perf_counter() - start
+        print(f"[lazy]    {name}: {elapsed*1000:.1f} ms")
+    print("(更详细的数据可使用 python -X importtime)")
+    ctx.exit()
+
+
+def start_stats(ctx, show_stats, stats_json, profile_file):
+    """启用统计及 cProfile, 在命令结束时 (包括调用 ctx.exit() 时) 输出结果。"""
+    if not (show_stats or stats_json or profile_file):
+        return
+
+    from .stats import stats
+    stats.enable()
+    profiler = None
+    if profile_file:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            print(f"cProfile 结果已写入 {profile_file} (可使用 python -m pstats 查看)")
+        if show_stats:
+            stats.print_report()
+        if stats_json:
+            report = json.dumps(stats.report(), ensure_ascii=False, indent=2)
+            Path(stats_json).write_text(report, encoding="utf-8")
+            print(f"统计结果已写入 {stats_json}")
+
+    ctx.call_on_close(finish)
+
+
 @click.group(invoke_without_command=True)
 @click.help_option("-h", "--help")
 @click.version_option(
@@ -73,12 +149,45 @@ def show_info(ctx, _, value):
     expose_value=False,
     callback=show_info,
 )
+@click.option(
+    "-profile-startup",
+    is_flag=True,
+    help="Show import timings of startup and lazy modules.",
+    expose_value=False,
+    callback=profile_startup,
+)
+@click.option(
+    "quiet",
+    "-q",
+    "-quiet",
+    is_flag=True,
+    help="Only show warnings and errors.",
+)
+@click.option(
+    "verbose",
+    "-verbose",
+    is_flag=True,
+    help="Also show every file written.",
+)
+@click.option(
+    "json_output",
+    "-json",
+    is_flag=True,
+    help="Print messages as JSON lines.",
+)
 @click.pass_context
-def cli(ctx):
+def cli(ctx, quiet, verbose, json_output):
     """PyBoke: Static Blog Generator (极简博客生成器)
 
     https://pypi.org/project/pyboke/
     """
+    level = logging.WARNING if quiet else logging.DEBUG if verbose else logging.INFO
+    log.setup(level, json_output)
+    # 命令结束时依次执行 (call_on_close 是后进先出):
+    # 把命令执行过程中对 blog.toml 的修改一次写入，压缩有变化的文件，然后保存写入的文件列表
+    ctx.call_on_close(manifest.record_build)
+    ctx.call_on_close(compress.compress_changes)
+    ctx.call_on_close(flush_blog_config)
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
         ctx.exit()
@@ -97,7 +206,7 @@ def init_command(ctx):
     初始化博客。请在一个空文件夹内执行 'boke init'。
     """
     if err := util.init_blog():
-        print(err)
+        log.error(err)
         ctx.exit()
 
 
@@ -112,16 +221,16 @@ def new(ctx, filename):
     check_initialization(ctx)
     file_path = Path(filename)
     if err := util.check_filename(file_path, Drafts_Folder_Path):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
     if file_path.exists():
-        print(f"Error: 文件已存在: {filename}")
+        log.error(f"Error: 文件已存在: {filename}")
         ctx.exit()
 
     dst = Drafts_Folder_Path.joinpath(file_path.name)
     shutil.copyfile(Draft_TMPL_Path, dst)
-    print("OK")
+    log.info("OK")
 
 
 @cli.command(context_settings=CONTEXT_SETTINGS)
@@ -135,19 +244,19 @@ def post(ctx, filename):
     cfg = check_initialization(ctx)
     file_path = Path(filename)
     if err := util.check_filename(file_path, Drafts_Folder_Path):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
     article = Articles_Folder_Path.joinpath(file_path.name)
     if article.exists():
-        print(f"Error: 文件已存在: {article}")
+        log.error(f"Error: 文件已存在: {article}")
         ctx.exit()
 
     shutil.move(file_path, article)
-    print(f"Move {filename} to {article}")
+    log.info(f"Move {filename} to {article}", event="move", src=filename, dst=str(article))
 
     if err := render_article(article, cfg, force=False):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
 
@@ -180,6 +289,13 @@ def post(ctx, filename):
     default=False,
     help="渲染全部文章"
 )
+@click.option(
+    "jobs",
+    "-jobs",
+    type=int,
+    default=1,
+    help="渲染全部文章时使用的进程数 (0 表示 CPU 核数)"
+)
 @click.option(
     "preview",
     "-preview",
@@ -194,8 +310,28 @@ def post(ctx, filename):
     default=False,
     help="强制渲染"
 )
+@click.option(
+    "show_stats",
+    "-stats",
+    is_flag=True,
+    default=False,
+    help="显示各阶段所用的时间及文章数量等统计"
+)
+@click.option(
+    "stats_json",
+    "-stats-json",
+    type=click.Path(dir_okay=False),
+    help="把统计结果写入 JSON 文件"
+)
+@click.option(
+    "profile_file",
+    "-profile",
+    type=click.Path(dir_okay=False),
+    help="使用 cProfile 并把结果写入文件 (只包括主进程)"
+)
 @click.pass_context
-def render(ctx, filename, index, rss, theme, render_all, preview, force):
+def render(ctx, filename, index, rss, theme, render_all, jobs, preview, force,
+           show_stats, stats_json, profile_file):
     """Render TOML and HTML. (渲染文章的 toml 和 html)
 
     Examples:
@@ -205,25 +341,33 @@ def render(ctx, filename, index, rss, theme, render_all, preview, force):
     boke render -force articles/abcd.md
 
     boke render -all
+
+    boke render -all -jobs 4
+
+    boke render -all -stats -stats-json stats.json
     """
+    start_stats(ctx, show_stats, stats_json, profile_file)
 
     if rss:
         cfg = check_initialization(ctx, check_website=True)
         render_rss(get_all_articles(), cfg, force=True)
+        get_catalog().save()  # 摘要缓存及 RSS 的摘要
         ctx.exit()
 
     cfg = check_initialization(ctx)
 
     if render_all:
-        if err := render_all_articles(cfg, force):
-            print(f"Error: {err}")
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        if err := render_all_articles(cfg, force, jobs):
+            log.error(f"Error: {err}")
         ctx.exit()
 
     if theme:
         themes = util.get_themes()
         if theme not in themes:
-            print(f"找不到主题: {theme}")
-            print(f"可选主题: {themes}")
+            log.error(f"找不到主题: {theme}")
+            log.error(f"可选主题: {themes}")
             ctx.exit()
         util.change_theme(theme, cfg)
 
@@ -234,22 +378,22 @@ def render(ctx, filename, index, rss, theme, render_all, preview, force):
         ctx.exit()
 
     if len(filename) != 1:
-        print("请指定 articles 文件夹中的 1 个文件，更多用法: boke render -h")
+        log.error("请指定 articles 文件夹中的 1 个文件，更多用法: boke render -h")
         ctx.exit()
 
     file_path = Path(filename[0])
 
     if preview:
         if err := preview_article(file_path, cfg):
-            print(f"Error: {err}")
+            log.error(f"Error: {err}")
         ctx.exit()
 
     if err := util.check_filename(file_path, Articles_Folder_Path):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
     if err := render_article(file_path, cfg, force):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
 
@@ -266,7 +410,7 @@ def rename(ctx, filenames):
     cfg = check_initialization(ctx)
     old_path, new_path = Path(filenames[0]), Path(filenames[1])
     if err := util.rename(old_path, new_path):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
     update_index_rss(cfg, force=True)
 
@@ -284,7 +428,7 @@ def delete(ctx, filename):
     blog_cfg = check_initialization(ctx)
     md_path = Path(filename)
     if err := util.check_filename(md_path, Articles_Folder_Path):
-        print(f"Error: {err}")
+        log.error(f"Error: {err}")
         ctx.exit()
 
     art_cfg_path = art_cfg_path_from_md_path(md_path)
@@ -292,3 +436,139 @@ def delete(ctx, filename):
     print(f"Title: {art_cfg.title}")
     click.confirm("Confirm deletion (确认删除，不可恢复)", abort=True)
     delete_article(md_path, art_cfg_path, blog_cfg)
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "since",
+    "-since",
+    type=int,
+    default=0,
+    help="只导出该次 build 之后有变化的文件 (0 表示全部)"
+)
+@click.option(
+    "tar_file",
+    "-tar",
+    type=click.Path(dir_okay=False),
+    help="把有变化的文件打包为 tar.gz"
+)
+@click.pass_context
+def export(ctx, since, tar_file):
+    """Export changed files for deployment. (导出有变化的文件)
+
+    列出 (或打包) 指定 build 之后 output 文件夹中有变化及被删除的文件，
+    最近一次 build 的编号见 .boke-cache/last-build.json
+
+    Examples:
+
+    boke export -since 12
+
+    boke export -since 12 -tar changes.tar.gz
+    """
+    check_initialization(ctx)
+    err, result = manifest.export(since, tar_file)
+    if err:
+        log.error(f"Error: {err}")
+        ctx.exit()
+
+    if log.options()["json_output"]:
+        print(json.dumps(result, ensure_ascii=False))
+        ctx.exit()
+
+    for path in result["changed"]:
+        print(f"+ {path}")
+    for path in result["deleted"]:
+        print(f"- {path}")
+    log.info(f"build: {result['build']}, 有变化: {len(result['changed'])}, "
+             f"已删除: {len(result['deleted'])}")
+    if tar_file:
+        log.info(f"有变化的文件已打包到 {tar_file}")
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS, name="search")
+@click.argument("query", nargs=-1, required=True)
+@click.pass_context
+def search_command(ctx, query):
+    """Search articles. (搜索文章)
+
+    使用 output/search 中的索引 (与网页 search.html 相同), 多个关键词取交集。
+
+    Examples:
+
+    boke search 静态网站
+
+    boke search python 博客
+    """
+    check_initialization(ctx)
+    err, docs = search.search(" ".join(query))
+    if err:
+        log.error(f"Error: {err}")
+        ctx.exit()
+
+    if log.options()["json_output"]:
+        print(json.dumps([dict(id=art_id, title=title) for art_id, title in docs],
+                         ensure_ascii=False))
+        ctx.exit()
+
+    for art_id, title in docs:
+        print(f"{art_id}.html  {title}")
+    log.info(f"找到 {len(docs)} 篇文章")
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "interval",
+    "-interval",
+    type=float,
+    default=0.5,
+    help="轮询间隔(秒)，未安装 watchdog 时使用"
+)
+@click.pass_context
+def watch(ctx, interval):
+    """Watch files and render automatically. (监视文件变化，自动渲染)
+
+    Example: boke watch
+    """
+    from .watch import watch_blog
+
+    cfg = check_initialization(ctx)
+    watch_blog(cfg, interval)
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "host",
+    "-host",
+    default="127.0.0.1",
+    help="服务器地址"
+)
+@click.option(
+    "port",
+    "-port",
+    type=int,
+    default=8000,
+    help="服务器端口"
+)
+@click.option(
+    "live",
+    "-live",
+    is_flag=True,
+    default=False,
+    help="文件变化后自动刷新页面"
+)
+@click.pass_context
+def serve(ctx, host, port, live):
+    """Preview the blog in browser. (本地预览服务器)
+
+    文章页面直接根据 markdown 在内存中渲染，不写入 output 文件夹。
+
+    Examples:
+
+    boke serve
+
+    boke serve -live -port 8080
+    """
+    from .serve import serve_blog
+
+    check_initialization(ctx)
+    serve_blog(host, port, live)
@@ -0,0 +1,205 @@
+"""
+output 文件夹的清单 (articles/metadata/manifest.json)
+
+记录 output 中每个文件的大小、sha1、来源文章 (如果是文章页面) 及最后一次变化时的 build 编号。
+每个写入或删除了 output 中的文件的命令都算作一次 build, build 编号逐次加一。
+
+boke export -since N 根据清单导出 build N 之后有变化或被删除的文件，
+因此只修改了一篇文章时，只需要上传少量文件。
+"""
+import hashlib
+import json
+import os
+
+from . import writer
+from .model import Manifest_Path, Last_Build_Path, Output_Folder_Path, Articles_Folder_Path, \
+    HTML_Suffix, MD_Suffix, now
+
+# 注意: manifest.py 只能 import model.py, writer.py
+
+Manifest_Version = 1
+
+Builds_Max = 1000
+"""最多保留多少次 build 的记录，更早的 build 无法用于 boke export -since"""
+
+
+def file_sha1(path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 16):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_of(rel_path: str) -> str:
+    """
+    :return: 如果是文章页面，返回文章的 id, 否则返回空字符串
+    """
+    if "/" in rel_path or not rel_path.endswith(HTML_Suffix):
+        return ""
+    art_id = rel_path.removesuffix(HTML_Suffix)
+    if Articles_Folder_Path.joinpath(art_id + MD_Suffix).exists():
+        return art_id
+    return ""
+
+
+class Manifest:
+    """
+    files: dict(相对于 output 的路径, dict(size, mtime_ns, sha1, source, build))
+    removed: dict(已删除文件的路径, 删除时的 build)
+    builds: [dict(build, time)], 只保留最近 Builds_Max 次
+    """
+
+    def __init__(self, build=0, builds=None, files=None, removed=None):
+        self.build = build
+        self.builds = builds if builds is not None else []
+        self.files = files if files is not None else {}
+        self.removed = removed if removed is not None else {}
+
+    @classmethod
+    def load(cls):
+        """
+        :return: Manifest, 文件不存在或已损坏时返回 None
+        """
+        try:
+            data = json.loads(Manifest_Path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("version") != Manifest_Version:
+            return None
+        return cls(data["build"], data["builds"], data["files"], data["removed"])
+
+    def save(self):
+        data = dict(version=Manifest_Version, build=self.build, builds=self.builds,
+                    files=self.files, removed=self.removed)
+        writer.write_if_changed(
+            Manifest_Path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    def oldest_build(self) -> int:
+        return self.builds[0]["build"] if self.builds else 0
+
+    def new_build(self) -> int:
+        self.build += 1
+        self.builds.append(dict(build=self.build, time=now()))
+        del self.builds[:-Builds_Max]
+        oldest = self.oldest_build()
+        self.removed = {path: b for path, b in self.removed.items() if b >= oldest}
+        return self.build
+
+    def set_file(self, rel_path, build, sha1=None, st=None):
+        path = Output_Folder_Path.joinpath(rel_path)
+        if st is None:
+            st = os.stat(path)
+        self.files[rel_path] = dict(
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            sha1=sha1 or file_sha1(path),
+            source=source_of(rel_path),
+            build=build,
+        )
+        self.removed.pop(rel_path, None)
+
+    def remove_file(self, rel_path, build):
+        if self.files.pop(rel_path, None) is not None:
+            self.removed[rel_path] = build
+
+    def apply(self, written, removed) -> int:
+        """把 writer 记录的变化作为新的一次 build. :return: build 编号"""
+        build = self.new_build()
+        for rel_path in written:
+            try:
+                self.set_file(rel_path, build)
+            except FileNotFoundError:
+                self.remove_file(rel_path, build)
+        for rel_path in removed:
+            self.remove_file(rel_path, build)
+        return build
+
+    def sync(self) -> bool:
+        """
+        对照 output 文件夹 (比如手动放入 output/pics 的图片), 只对 stat 有变化的文件计算 sha1,
+        如果有文件变化或被删除，则作为新的一次 build.
+
+        :return: 是否有变化
+        """
+        changed, seen = [], set()
+        for root, _, files in os.walk(Output_Folder_Path):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, Output_Folder_Path).replace(os.sep, "/")
+                seen.add(rel_path)
+                st = os.stat(path)
+                entry = self.files.get(rel_path)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    continue
+                sha1 = file_sha1(path)
+                if entry and entry["sha1"] == sha1:
+                    entry["mtime_ns"] = st.st_mtime_ns  # 内容没变，只更新 mtime
+                    continue
+                changed.append((rel_path, sha1, st))
+
+        gone = self.files.keys() - seen
+        if not changed and not gone:
+            return False
+        build = self.new_build()
+        for rel_path, sha1, st in changed:
+            self.set_file(rel_path, build, sha1, st)
+        for rel_path in gone:
+            self.remove_file(rel_path, build)
+        return True
+
+
+def record_build():
+    """
+    在命令结束时调用。如果本次命令写入或删除了 output 中的文件，则更新清单，
+    并把本次的文件列表保存到 Last_Build_Path:
+    {"build": 12, "time": "...", "written": ["index.html", ...], "removed": [...]}
+    """
+    written, removed = writer.take_output_changes()
+    if not written and not removed:
+        return
+    manifest = Manifest.load()
+    if manifest is None:
+        # 清单不存在，扫描整个 output 文件夹生成清单
+        manifest = Manifest()
+        manifest.sync()
+        build = manifest.build
+    else:
+        build = manifest.apply(written, removed)
+    manifest.save()
+    Last_Build_Path.parent.mkdir(parents=True, exist_ok=True)
+    data = dict(build=build, time=now(), written=written, removed=removed)
+    writer.write_if_changed(Last_Build_Path, json.dumps(data, ensure_ascii=False, indent=2))
+    # 以上写入的文件不在 output 中，不需要记录
+    writer.changes.take()
+
+
+def export(since: int, tar_path=None):
+    """
+    先对照 output 文件夹更新清单，然后找出 build since 之后有变化及被删除的文件。
+
+    :param tar_path: 如果提供，则把有变化的文件打包为 tar.gz
+    :return: 发生错误时返回 (err, None), 否则返回 (None, dict(build, changed, deleted))
+    """
+    manifest = Manifest.load() or Manifest()
+    manifest.sync()
+    manifest.save()
+    writer.changes.take()
+
+    if since > manifest.build:
+        return f"build {since} 不存在，目前最新的 build 是 {manifest.build}", None
+    if 0 < since < manifest.oldest_build() - 1:
+        return f"build {since} 太旧，已无记录，请使用 -since 0 导出全部文件", None
+
+    changed = sorted(path for path, entry in manifest.files.items() if entry["build"] > since)
+    deleted = sorted(path for path, build in manifest.removed.items() if build > since)
+
+    if tar_path:
+        import tarfile
+        with tarfile.open(tar_path, "w:gz") as tar:
+            for rel_path in changed:
+                tar.add(Output_Folder_Path.joinpath(rel_path), arcname=rel_path)
+
+    return None, dict(build=manifest.build, changed=changed, deleted=deleted)
@@ -0,0 +1,85 @@
+"""
+markdown 转换结果的缓存 (.boke-cache/markdown)
+
+key 由文章的 checksum, 替换规则 (pairs), 图片的 srcset 及 mistune 的版本计算得出，
+因此文章内容不变时，即使模板或 blog.toml 有变化 (需要强制渲染全部文章),
+也不需要重新解析 markdown.
+
+每个缓存项是一个文件，命中时更新其 mtime, 清理时删除 mtime 最旧的文件 (LRU)。
+"""
+import hashlib
+import json
+import os
+
+from .model import MD_Cache_Path, HTML_Suffix
+
+# 注意: md_cache.py 只能 import model.py
+
+_pending = 0
+"""本进程新写入的缓存项的数量，为零时 prune() 不需要检查文件夹"""
+
+
+def cache_key(checksum: str, pairs: list, version: str, images: dict = None) -> str:
+    """:param images: 文章中的图片的 srcset (见 images.srcset_map), 没有时不影响 key"""
+    key = [checksum, pairs, version]
+    if images:
+        key.append(images)
+    data = json.dumps(key, ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def cache_path(key: str):
+    return MD_Cache_Path.joinpath(f"{key}{HTML_Suffix}")
+
+
+def get_html(key: str):
+    """
+    :return: 缓存的 HTML 片段，未命中时返回 None
+    """
+    path = cache_path(key)
+    try:
+        html = path.read_text(encoding="utf-8")
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return html
+
+
+def put_html(key: str, html: str):
+    """先写临时文件再改名，因此多个进程同时写入也不会产生残缺的缓存。"""
+    global _pending
+    MD_Cache_Path.mkdir(parents=True, exist_ok=True)
+    path = cache_path(key)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(html, encoding="utf-8")
+    os.replace(temp_path, path)
+    _pending += 1
+
+
+def prune(max_entries: int, force: bool = False):
+    """
+    缓存项超过 max_entries 时，删除最久未使用的缓存项。
+
+    :param force: 缓存项可能由子进程写入 (本进程的 _pending 为零), 此时需要强制检查
+    """
+    global _pending
+    if _pending == 0 and not force:
+        return
+    _pending = 0
+    try:
+        it = os.scandir(MD_Cache_Path)
+    except FileNotFoundError:
+        return
+    with it:
+        entries = [
+            (entry.stat().st_mtime_ns, entry.path)
+            for entry in it if entry.name.endswith(HTML_Suffix)
+        ]
+    if len(entries) <= max_entries:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # 可能已被另一个进程删除
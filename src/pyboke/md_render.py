@@ -0,0 +1,110 @@
+"""
+把 markdown 转换为 HTML (mistune).
+
+导入 mistune 比较耗时，因此本模块只在需要渲染文章时才导入 (见 tmpl_render.markdown_to_html)。
+
+全部文章共用同一个 Markdown 实例 (不需要每篇文章重新生成)。
+自动替换 (pairs) 依次把 markdown 原文中每对的第一个字符串的第一次出现替换为第二个字符串，
+只对文中存在的字符串执行 str.replace(). 渲染时为已缩放的图片加上 srcset (见 images.py)。
+"""
+import mistune
+
+# 注意: md_render.py 不可 import 本项目的其他模块
+
+Cache_Version = f"mistune-{mistune.__version__}-pairs-2"
+"""用于 markdown 缓存的 key, 本模块的渲染规则有变化时应修改这里的数字"""
+
+Plugins = ["strikethrough", "footnotes", "table"]
+"""与 mistune.html 使用的插件相同"""
+
+
+class PairsRenderer(mistune.HTMLRenderer):
+    """
+    渲染图片时，如果图片的原地址在 state.env["srcsets"] 中，则加上 srcset, 详见 srcset_attr().
+    图片地址已被 pairs 替换时，通过 state.env["origins"] (dict(新地址, 原地址)) 找回原地址。
+
+    这些数据保存在每次渲染独有的 state 中，因此可以在多个线程中共用 (boke serve)。
+    """
+
+    def render_token(self, token, state):
+        html = super().render_token(token, state)
+        srcsets = state.env.get("srcsets")
+        if token["type"] != "image" or not srcsets:
+            return html
+
+        new_url = token["attrs"]["url"]
+        url = state.env["origins"].get(new_url, new_url)
+        if candidates := srcsets.get(url):
+            if srcset := srcset_attr(candidates, url, new_url, state.env["pics_url"]):
+                html = html.removesuffix(" />") + f' srcset="{srcset}" />'
+        return html
+
+
+def srcset_attr(candidates: list, url: str, new_url: str, pics_url: str) -> str:
+    """
+    :param candidates: [[相对于 output/pics 的路径, 宽度], ...], 最后一项是原图
+    :param pics_url: output/pics 相对于 output 的地址，即 "pics/"
+
+    图片地址未被替换时，使用相对地址 (pics/resized/...)。
+    地址被 pairs 替换为以原图路径结尾的地址时 (比如 https://example.com/pics/abc.jpg),
+    缩放后的图片也使用同一个前缀 (须把整个 output/pics 上传到该位置)。
+    其他情况返回空字符串 (不加 srcset), 以 pairs 为准。
+    """
+    if new_url == url:
+        base = pics_url
+    elif new_url.endswith("/" + candidates[-1][0]):
+        base = new_url.removesuffix(candidates[-1][0])
+    else:
+        return ""
+    return ", ".join(f"{base}{path} {width}w" for path, width in candidates)
+
+
+_markdown = None
+
+
+def get_markdown() -> mistune.Markdown:
+    global _markdown
+    if _markdown is None:
+        _markdown = mistune.create_markdown(
+            renderer=PairsRenderer(escape=False), plugins=Plugins)
+    return _markdown
+
+
+def render(md_text: str, srcsets: dict = None, pics_url: str = "", origins: dict = None) -> str:
+    md = get_markdown()
+    state = md.block.state_cls()
+    state.env["srcsets"] = srcsets
+    state.env["pics_url"] = pics_url
+    state.env["origins"] = origins or {}
+    html, _ = md.parse(md_text, state)
+    return html
+
+
+def replace_first(text: str, pairs: list):
+    """
+    依次把每对的第一个字符串的第一次出现替换为第二个字符串，
+    与逐对执行 text.replace(old, new, 1) 的结果相同，但跳过文中不存在的字符串 (不复制 text)。
+
+    :return: (new_text, dict(新字符串, 原字符串)), 后者只包括实际执行了的替换
+    """
+    replaced = {}
+    for old, new in pairs:
+        if old in text:
+            text = text.replace(old, new, 1)
+            replaced.setdefault(new, old)
+    return text, replaced
+
+
+def markdown_to_html(
+        md_text: str, pairs: list, srcsets: dict = None, pics_url: str = "") -> str:
+    """
+    先对 markdown 原文执行 replace_first() 再渲染，因此 pairs 可以替换任意文字，
+    但只替换第一次出现的地方 (包括出现在代码块中的情况)。
+
+    :param srcsets: 见 images.srcset_map()
+    """
+    if not pairs and not srcsets:
+        return get_markdown()(md_text)
+
+    md_text, origins = replace_first(md_text, pairs)
+    return render(md_text, srcsets, pics_url, origins)
@@ -0,0 +1,84 @@
+"""
+压缩 HTML 及 CSS 的空白 (blog.toml 中的 minify)
+
+只做不改变显示效果的处理:
+- HTML: 标签之间及文字中连续的空白压缩为一个 (包含换行时压缩为一个换行),
+  标签内部的空白压缩为一个空格 (不处理属性值),
+  不处理 <pre>, <code>, <textarea>, <script> 的内容。
+  <style> 的内容按 CSS 压缩。
+- CSS: 删除注释，压缩空白，删除 { } ; , > 两侧及 : 后面的空格，不处理字符串的内容。
+"""
+import re
+
+# 注意: minify.py 不可 import 本项目的其他模块
+
+Preserve_Pattern = re.compile(
+    r"<(pre|code|textarea|script|style)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+"""内容需要保持原样的元素 (<style> 除外)"""
+
+Tag_Pattern = re.compile(r"(<[^>]*>)")
+
+Space_Pattern = re.compile(r"\s+")
+
+Quoted_Pattern = re.compile(r"""("[^"]*"|'[^']*')""")
+
+Style_Pattern = re.compile(r"(<style\b[^>]*>)(.*?)(</style\s*>)", re.IGNORECASE | re.DOTALL)
+
+CSS_Token_Pattern = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.DOTALL)
+"""CSS 中的字符串 (group 1) 或注释"""
+
+CSS_Punct_Pattern = re.compile(r" ?([{};,>]) ?")
+
+CSS_Property_Pattern = re.compile(r"([{;][-\w]+) :")
+"""属性名与冒号之间的空格 (选择器中的 "a :hover" 不能删除空格)"""
+
+
+def collapse_space(match) -> str:
+    return "\n" if "\n" in match.group(0) else " "
+
+
+def minify_tag(tag: str) -> str:
+    parts = Quoted_Pattern.split(tag)
+    parts[::2] = [Space_Pattern.sub(" ", part) for part in parts[::2]]
+    return "".join(parts)
+
+
+def minify_text(text: str) -> str:
+    parts = Tag_Pattern.split(text)
+    parts[::2] = [Space_Pattern.sub(collapse_space, part) for part in parts[::2]]
+    parts[1::2] = [minify_tag(part) for part in parts[1::2]]
+    return "".join(parts)
+
+
+def minify_html(html: str) -> str:
+    result = []
+    pos = 0
+    for match in Preserve_Pattern.finditer(html):
+        result.append(minify_text(html[pos:match.start()]))
+        element = match.group(0)
+        if match.group(1).lower() == "style":
+            element = Style_Pattern.sub(
+                lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), element)
+        result.append(element)
+        pos = match.end()
+    result.append(minify_text(html[pos:]))
+    return "".join(result).strip() + "\n"
+
+
+def compact_css(css: str) -> str:
+    css = Space_Pattern.sub(" ", css)
+    css = CSS_Punct_Pattern.sub(r"\1", css)
+    css = CSS_Property_Pattern.sub(r"\1:", css)
+    return css.replace(": ", ":").replace(";}", "}")
+
+
+def minify_css(css: str) -> str:
+    result = []
+    pos = 0
+    for match in CSS_Token_Pattern.finditer(css):
+        result.append(compact_css(css[pos:match.start()]))
+        # 注释替换为一个空格，避免前后的内容连在一起
+        result.append(match.group(1) or " ")
+        pos = match.end()
+    result.append(compact_css(css[pos:]))
+    return "".join(result).strip()
@@ -1,19 +1,25 @@
 import hashlib
 import re
 from dataclasses import dataclass, asdict
+from datetime import datetime
 from pathlib import Path
+from types import SimpleNamespace
 
-import arrow
-import tomli
+try:
+    import tomllib  # Python 3.11+
+except ModuleNotFoundError:
+    import tomli as tomllib
 
 # 注意: model.py 在最底层，不能 import util.py, tmpl_render.py, 更不能 import main.py
 
-RFC3339               = "YYYY-MM-DD HH:mm:ssZZ"
 Blog_Config_Filename  = "blog.toml"
 Drafts_Folder_Name    = "drafts"
 Draft_TMPL_Name       = "draft.md"
 Articles_Folder_Name  = "articles"
 Pics_Folder_Name      = "pics"
+Years_Folder_Name     = "years"
+Indexes_Folder_Name   = "title-index"
+Pages_Folder_Name     = "page"
 Metadata_Folder_Name  = "metadata"
 Output_Folder_Name    = "output"
 Templates_Folder_Name = "templates"
@@ -23,22 +29,53 @@ TOML_Suffix           = ".toml"
 MD_Suffix             = ".md"
 RSS_Atom_XML          = "atom.xml"
 Theme_CSS_Name        = "theme.css"
+Style_CSS_Name        = "style.css"
+Random_JSON_Name      = "random.json"
 Default_Theme_Name    = "simple"
 Temp_HTML             = "temp.html"
+Catalog_Name          = "catalog.json"
+Manifest_Name         = "manifest.json"
+Cache_Folder_Name     = ".boke-cache"
+MD_Cache_Folder_Name  = "markdown"
+Last_Build_Name       = "last-build.json"
+Search_Folder_Name    = "search"
+Search_State_Name     = "search.json"
+Resized_Folder_Name   = "resized"
+Images_State_Name     = "images.json"
+Precompress_Name      = "precompress.json"
 
 CWD = Path.cwd().resolve()
 Drafts_Folder_Path    = CWD.joinpath(Drafts_Folder_Name)
 Articles_Folder_Path  = CWD.joinpath(Articles_Folder_Name)
 Metadata_Folder_Path  = Articles_Folder_Path.joinpath(Metadata_Folder_Name)
+Catalog_Path          = Metadata_Folder_Path.joinpath(Catalog_Name)
+Manifest_Path         = Metadata_Folder_Path.joinpath(Manifest_Name)
 Output_Folder_Path    = CWD.joinpath(Output_Folder_Name)
 Pics_Folder_Path      = Output_Folder_Path.joinpath(Pics_Folder_Name)
+Resized_Folder_Path   = Pics_Folder_Path.joinpath(Resized_Folder_Name)
+Years_Folder_Path     = Output_Folder_Path.joinpath(Years_Folder_Name)
+Indexes_Folder_Path   = Output_Folder_Path.joinpath(Indexes_Folder_Name)
+Pages_Folder_Path     = Output_Folder_Path.joinpath(Pages_Folder_Name)
 RSS_Path              = Output_Folder_Path.joinpath(RSS_Atom_XML)
 Theme_CSS_Path        = Output_Folder_Path.joinpath(Theme_CSS_Name)
 Temp_HTML_Path        = Output_Folder_Path.joinpath(Temp_HTML)
+Search_Folder_Path    = Output_Folder_Path.joinpath(Search_Folder_Name)
+Random_JSON_Path      = Output_Folder_Path.joinpath(Random_JSON_Name)
 Templates_Folder_Path = CWD.joinpath(Templates_Folder_Name)
 Themes_Folder_Path    = Templates_Folder_Path.joinpath(Themes_Folder_Name)
 Draft_TMPL_Path       = Templates_Folder_Path.joinpath(Draft_TMPL_Name)
 Blog_Config_Path      = CWD.joinpath(Blog_Config_Filename)
+Cache_Folder_Path     = CWD.joinpath(Cache_Folder_Name)
+Templates_Cache_Path  = Cache_Folder_Path.joinpath(Templates_Folder_Name)
+MD_Cache_Path         = Cache_Folder_Path.joinpath(MD_Cache_Folder_Name)
+Last_Build_Path       = Cache_Folder_Path.joinpath(Last_Build_Name)
+Search_State_Path     = Cache_Folder_Path.joinpath(Search_State_Name)
+Images_State_Path     = Cache_Folder_Path.joinpath(Images_State_Name)
+Precompress_Path      = Cache_Folder_Path.joinpath(Precompress_Name)
+Package_Tmpl_Path     = Path(__file__).parent.joinpath(Templates_Folder_Name)
+
+MD_Cache_Spare = 200
+"""markdown 缓存最多保留 文章数 + MD_Cache_Spare 个，超出时删除最久未使用的"""
 
 Filename_Forbid_Pattern = re.compile(r"[^._0-9a-zA-Z\-]")
 """文件名只能使用 0-9, a-z, A-Z, _(下划线), -(短横线), .(点)。"""
@@ -49,14 +86,17 @@ Title_Index_Length = 1
 """标题索引字数（以后有可能改成允许用户自定义）"""
 
 RSS_Entries_Max = 10
-"""RSS 里最多可包含多少篇文章"""
+"""RSS 里最多可包含多少篇文章 (默认值，可在 blog.toml 中修改)"""
 
 RSS_Content_Size = 256
-"""RSS 里每篇文章的摘要长度上限，单位: UTF8字符"""
+"""RSS 里每篇文章的摘要长度上限，单位: UTF8字符 (默认值，可在 blog.toml 中修改)"""
 
 
 def now():
-    return arrow.now().format(RFC3339)
+    """
+    当前时间（本地时区），格式为 RFC3339, 例如 '2022-05-01 12:00:00+08:00'
+    """
+    return datetime.now().astimezone().isoformat(sep=" ", timespec="seconds")
 
 
 @dataclass
@@ -72,7 +112,13 @@ class BlogConfig:
     blog_updated     : str   # 博客更新日期，如果大于 rss_updated 就要重新生成 RSS
     auto_replace     : bool  # 是否执行自动替换
     img_max_width    : str   # HTML中的图片的最大宽度
+    img_widths       : list  # 图片缩放的宽度 (像素), 为空表示不缩放
     current_theme    : str   # 当前主题 (CSS)
+    split_listing    : bool  # 是否拆分年份、标题索引页面，并为首页以外的文章分页
+    rss_entries_max  : int   # RSS 里最多可包含多少篇文章
+    rss_content_size : int   # RSS 里每篇文章的摘要长度上限，单位: UTF8字符
+    precompress      : bool  # 是否为 output 中的文本文件生成 .gz (及 .br) 压缩文件
+    minify           : bool  # 是否压缩 HTML 及 CSS 的空白
 
     @classmethod
     def default(cls):
@@ -88,13 +134,23 @@ class BlogConfig:
             blog_updated     = now(),
             auto_replace     = True,
             img_max_width    = "100%",
+            img_widths       = [],
             current_theme    = "simple",
+            split_listing    = False,
+            rss_entries_max  = RSS_Entries_Max,
+            rss_content_size = RSS_Content_Size,
+            precompress      = False,
+            minify           = False,
         )
 
     @classmethod
     def loads(cls):
-        """Loads BlogConfig from Blog_Config_Path"""
-        data = tomli_loads(Blog_Config_Path)
+        """
+        Loads BlogConfig from Blog_Config_Path.
+        旧版本的 blog.toml 可能缺少一些项目，缺少的项目采用默认值。
+        """
+        data = asdict(cls.default())
+        data.update(tomli_loads(Blog_Config_Path))
         return BlogConfig(**data)
 
 
@@ -155,11 +211,60 @@ class ArticleConfig:
         return ArticleConfig(**asdict(self))
 
 
+@dataclass(frozen=True, slots=True)
+class Article:
+    """
+    只读的文章记录，供列表页面、RSS 及文章页面的模板直接使用。
+    由 catalog 中的数据生成，预先算好 id, index_id, year, 不需要再转换为 dict.
+    """
+    id        : str
+    title     : str
+    author    : str
+    ctime     : str
+    mtime     : str
+    checksum  : str
+    ignored   : bool
+    img_width : str
+    replace   : int
+    pairs     : tuple
+    index_id  : str   # 标题索引的 id, 详见 title_index_id()
+    year      : str   # ctime 的年份
+    content   : str = ""  # 文章正文的 HTML 或 RSS 摘要，只在需要时才填写
+
+    @classmethod
+    def from_config(cls, art_id: str, art_cfg, content: str = ""):
+        """
+        :param art_cfg: ArticleConfig 或 catalog 中的 dict
+        """
+        if isinstance(art_cfg, dict):
+            art_cfg = SimpleNamespace(**art_cfg)
+        return Article(
+            id        = art_id,
+            title     = art_cfg.title,
+            author    = art_cfg.author,
+            ctime     = art_cfg.ctime,
+            mtime     = art_cfg.mtime,
+            checksum  = art_cfg.checksum,
+            ignored   = art_cfg.ignored,
+            img_width = art_cfg.img_width,
+            replace   = art_cfg.replace,
+            pairs     = tuple(tuple(pair) for pair in art_cfg.pairs),
+            index_id  = title_index_id(art_cfg.title),
+            year      = art_cfg.ctime[:4],
+            content   = content,
+        )
+
+
 @dataclass
 class TitleIndex:
     name: str
     id: str
-    articles: list  # List[ArticleConfig]
+    articles: list  # List[Article]
+
+
+def title_index_id(title: str) -> str:
+    index = title[:Title_Index_Length]
+    return f"i{index.encode().hex()}"
 
 
 def tomli_loads(file) -> dict:
@@ -170,7 +275,7 @@ def tomli_loads(file) -> dict:
             text = text.decode()  # Default encoding is 'utf-8'.
         except UnicodeDecodeError:
             text = text.decode("utf-16").encode("utf-8").decode("utf-8")
-        return tomli.loads(text)
+        return tomllib.loads(text)
 
 
 def get_first_line(file):
@@ -0,0 +1,279 @@
+"""
+全文搜索索引 (output/search/)
+
+文章的标题与正文按以下规则切分为 token:
+- 中文、日文、韩文: 连续的字切分为相邻两字 (bigram), 每段的最后一个字另作为一个 token.
+- 其他: 连续的字母、数字作为一个词 (转为小写)。
+
+索引由以下文件组成，都是 JSON, 适合 gzip 压缩:
+- docs.json: 参与搜索的文章 [[id, 标题], ...] 及分片数量。
+- 0.json ~ 63.json: 主索引的分片 {token: [id, ...]}, token 按第一个字的 Unicode 编码分片，
+  因此以同一个字开头的 token 都在同一个分片中 (可用于前缀搜索)。
+- delta.json: 最近有变化的文章的索引 {token: [id, ...]}, 以及主索引中已过时的文章 id (stale).
+
+更新一篇文章时只改写 delta.json, 不需要改写分片。
+delta 中的文章超过 Delta_Max 篇时才合并到主索引，并且只改写受影响的分片。
+每篇文章的 checksum 及其所在的分片记录在 .boke-cache/search.json,
+该文件不存在时 (比如删除了 .boke-cache) 重新生成全部索引。
+
+搜索时 (网页 search.html 及 boke search 命令), 每个关键词的结果为
+(主索引的结果 - stale) + delta 的结果, 多个关键词取交集。
+"""
+import json
+import re
+
+from . import log, writer
+from .stats import stats
+from .model import Search_Folder_Path, Search_State_Path, Articles_Folder_Path, MD_Suffix
+
+# 注意: search.py 只能 import model.py, log.py, stats.py, writer.py
+
+Search_Version = 1
+"""索引格式 (包括切分规则) 的版本，版本不一致时重新生成全部索引"""
+
+Shards = 64
+"""主索引的分片数量 (search.html 从 docs.json 读取，不需要另外修改)"""
+
+Delta_Max = 50
+"""delta 中最多保留多少篇文章，超过时合并到主索引"""
+
+Word_Length_Max = 32
+
+CJK_Chars = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+"""假名、汉字、谚文 (须与 search.html 中的一致)"""
+
+Token_Pattern = re.compile(f"([{CJK_Chars}]+)|([0-9a-z\u00c0-\u024f]+)")
+
+Docs_Name = "docs.json"
+Delta_Name = "delta.json"
+
+
+def tokenize(text: str) -> set:
+    tokens = set()
+    for cjk, word in Token_Pattern.findall(text.lower()):
+        if word:
+            tokens.add(word[:Word_Length_Max])
+            continue
+        tokens.update(cjk[i:i+2] for i in range(len(cjk) - 1))
+        tokens.add(cjk[-1])
+    return tokens
+
+
+def query_terms(query: str) -> list:
+    """
+    把搜索关键词切分为 [(token, 是否前缀匹配)].
+    单独一个汉字及英文单词采用前缀匹配，比如 "py" 可找到 "python".
+    """
+    terms = []
+    for cjk, word in Token_Pattern.findall(query.lower()):
+        if word:
+            terms.append((word[:Word_Length_Max], True))
+        elif len(cjk) == 1:
+            terms.append((cjk, True))
+        else:
+            terms += [(cjk[i:i+2], False) for i in range(len(cjk) - 1)]
+    return terms
+
+
+def shard_of(token: str) -> int:
+    return ord(token[0]) % Shards
+
+
+def shard_path(n: int):
+    return Search_Folder_Path.joinpath(f"{n}.json")
+
+
+def read_json(path, default):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def write_json(path, data) -> bool:
+    return writer.write_if_changed(
+        path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+
+def article_tokens(art) -> set:
+    md_file = Articles_Folder_Path.joinpath(art.id + MD_Suffix)
+    return tokenize(art.title + "\n" + md_file.read_text(encoding="utf-8"))
+
+
+def invert(doc_tokens: dict) -> dict:
+    """dict(id, tokens) 转换为 dict(token, [id, ...])"""
+    index = {}
+    for art_id, tokens in doc_tokens.items():
+        for token in tokens:
+            index.setdefault(token, []).append(art_id)
+    return index
+
+
+def shard_mask(tokens) -> int:
+    """文章出现在哪些分片中，用 bit 表示"""
+    mask = 0
+    for token in tokens:
+        mask |= 1 << shard_of(token)
+    return mask
+
+
+def mask_shards(mask: int):
+    return (n for n in range(Shards) if mask >> n & 1)
+
+
+class SearchState:
+    """
+    checksums: dict(id, checksum), 已加入索引的文章
+    base: dict(id, 分片 mask), 在主索引中的文章 (可能已过时)
+    delta: dict(id, [token, ...]), 在 delta 中的文章
+    """
+
+    def __init__(self, checksums=None, base=None, delta=None):
+        self.checksums = checksums if checksums is not None else {}
+        self.base = base if base is not None else {}
+        self.delta = delta if delta is not None else {}
+
+    @classmethod
+    def load(cls):
+        """文件不存在、已损坏或版本不一致时返回 None"""
+        data = read_json(Search_State_Path, {})
+        if data.get("version") != Search_Version or data.get("shards") != Shards:
+            return None
+        return cls(data["checksums"], data["base"], data["delta"])
+
+    def save(self):
+        Search_State_Path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(Search_State_Path, dict(
+            version=Search_Version, shards=Shards,
+            checksums=self.checksums, base=self.base, delta=self.delta))
+
+    def stale(self) -> list:
+        """主索引中已过时 (已删除或在 delta 中有新版本) 的文章"""
+        return sorted(art_id for art_id in self.base
+                      if art_id in self.delta or art_id not in self.checksums)
+
+    def merge_delta(self):
+        """把 delta 合并到主索引，只读写受影响的分片"""
+        stale = self.stale()
+        delta_index = invert(self.delta)
+        affected = {shard_of(token) for token in delta_index}
+        for art_id in stale:
+            affected.update(mask_shards(self.base[art_id]))
+
+        stale_set = set(stale)
+        shards = {n: {} for n in affected}
+        for n in affected:
+            for token, ids in read_json(shard_path(n), {}).items():
+                ids = [art_id for art_id in ids if art_id not in stale_set]
+                if ids:
+                    shards[n][token] = ids
+        for token, ids in delta_index.items():
+            shards[shard_of(token)].setdefault(token, []).extend(ids)
+        for n, shard in shards.items():
+            write_shard(n, shard)
+
+        for art_id in stale:
+            del self.base[art_id]
+        for art_id, tokens in self.delta.items():
+            self.base[art_id] = shard_mask(tokens)
+        self.delta = {}
+        log.debug(f"search: 合并 {len(delta_index)} 个 token 到 {len(affected)} 个分片",
+                  event="search_merge", shards=len(affected))
+
+
+def write_shard(n: int, shard: dict):
+    data = {token: sorted(set(ids)) for token, ids in sorted(shard.items())}
+    write_json(shard_path(n), data)
+
+
+def rebuild(articles) -> SearchState:
+    """重新生成全部索引"""
+    doc_tokens = {art.id: article_tokens(art) for art in articles}
+    shards = [{} for _ in range(Shards)]
+    for token, ids in invert(doc_tokens).items():
+        shards[shard_of(token)][token] = ids
+    for n, shard in enumerate(shards):
+        write_shard(n, shard)
+    return SearchState(
+        checksums={art.id: art.checksum for art in articles},
+        base={art_id: shard_mask(tokens) for art_id, tokens in doc_tokens.items()},
+    )
+
+
+def update_index(articles) -> int:
+    """
+    根据文章的 checksum 更新搜索索引。
+    即使列表页面被强制渲染 (比如 boke render -index, boke rename), 也只处理有变化的文章，
+    只有 search.json 不存在或版本不一致时才重新生成全部索引。
+    更改文件名相当于删除旧 id 并在 delta 中加入新 id.
+
+    :param articles: 全部文章 (Article), 按显示顺序排列。忽略的文章 (ignored) 不加入索引。
+    :return: 重新索引及删除的文章数量
+    """
+    with stats.phase("search"):
+        articles = [art for art in articles if not art.ignored]
+        Search_Folder_Path.mkdir(exist_ok=True)
+        state = SearchState.load()
+        if state is None or not Search_Folder_Path.joinpath(Docs_Name).exists():
+            state = rebuild(articles)
+            count = len(articles)
+        else:
+            current = {art.id for art in articles}
+            changed = [art for art in articles
+                       if state.checksums.get(art.id) != art.checksum]
+            removed = [art_id for art_id in state.checksums if art_id not in current]
+            count = len(changed) + len(removed)
+            for art_id in removed:
+                del state.checksums[art_id]
+                state.delta.pop(art_id, None)
+            for art in changed:
+                state.checksums[art.id] = art.checksum
+                state.delta[art.id] = sorted(article_tokens(art))
+            if len(state.delta) > Delta_Max:
+                state.merge_delta()
+
+        write_json(Search_Folder_Path.joinpath(Delta_Name),
+                   dict(stale=state.stale(), tokens=invert(state.delta)))
+        write_json(Search_Folder_Path.joinpath(Docs_Name),
+                   dict(shards=Shards, docs=[[art.id, art.title] for art in articles]))
+        state.save()
+        stats.count("search_updated", count)
+        return count
+
+
+def search(query: str):
+    """
+    使用 output/search 中的索引搜索文章。
+
+    :return: 发生错误时返回 (err, None), 否则返回 (None, [[id, 标题], ...])
+    """
+    terms = query_terms(query)
+    if not terms:
+        return "请输入关键词 (中文、英文字母或数字)", None
+    docs = read_json(Search_Folder_Path.joinpath(Docs_Name), None)
+    if docs is None:
+        return "搜索索引不存在，请先执行 boke render -index", None
+    if docs["shards"] != Shards:
+        return "搜索索引的版本不一致，请执行 boke render -index", None
+    delta = read_json(Search_Folder_Path.joinpath(Delta_Name), dict(stale=[], tokens={}))
+    stale = set(delta["stale"])
+
+    shards = {}
+    found = None
+    for token, prefix in terms:
+        n = shard_of(token)
+        if n not in shards:
+            shards[n] = read_json(shard_path(n), {})
+        ids = set()
+        for index, skip in ((shards[n], stale), (delta["tokens"], ())):
+            if prefix:
+                matched = (v for k, v in index.items() if k.startswith(token))
+            else:
+                matched = [index.get(token, [])]
+            for v in matched:
+                ids.update(art_id for art_id in v if art_id not in skip)
+        found = ids if found is None else found & ids
+        if not found:
+            return None, []
+
+    return None, [doc for doc in docs["docs"] if doc[0] in found]
@@ -0,0 +1,228 @@
+"""
+boke serve: 本地预览服务器。
+
+- 以 output 文件夹为网站根目录。
+- 请求文章页面 (比如 /abc.html) 时，如果 articles/abc.md 存在，则直接根据 markdown
+  在内存中渲染，不写入 output 文件夹 (因此不会影响部署工具)。
+- 使用 ETag 让浏览器缓存页面，文章及其设定、模板都未变化时返回 304 (不需要渲染)。
+  blog.toml 只在其 mtime 或大小变化时才重新读取。
+- 使用 -live 参数时，页面会在文件变化后自动刷新。
+  全部浏览器共用一个线程扫描文件，没有浏览器连接时不扫描。
+"""
+import hashlib
+import threading
+import time
+from functools import partial
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, unquote
+
+from . import log
+from .catalog import file_stat
+from .model import BlogConfig, Articles_Folder_Path, Output_Folder_Path, \
+    Blog_Config_Path, HTML_Suffix, MD_Suffix
+from .tmpl_render import render_article_in_memory
+from .watch import take_snapshot, scan_files
+
+Live_Reload_Path = "/__livereload"
+
+Live_Reload_Interval = 0.5
+"""扫描文件变化的间隔 (秒)"""
+
+Live_Reload_Ping = 5
+"""没有变化时，每隔这么多秒向浏览器发送一次注释行，用于检测浏览器是否已断开连接"""
+
+Live_Reload_Script = f"""<script>
+new EventSource("{Live_Reload_Path}").onmessage = () => location.reload();
+</script>
+"""
+
+
+def inject_live_reload(html: bytes) -> bytes:
+    script = Live_Reload_Script.encode()
+    pos = html.rfind(b"</body>")
+    if pos < 0:
+        return html + script
+    return html[:pos] + script + html[pos:]
+
+
+_blog_config = (None, None)
+"""(blog.toml 的 stat, BlogConfig), 详见 get_blog_config()"""
+
+
+def get_blog_config() -> BlogConfig:
+    """blog.toml 未变化时重复使用上次读取的结果，不需要每个请求都解析 toml."""
+    global _blog_config
+    stat = file_stat(Blog_Config_Path)
+    cached_stat, blog_cfg = _blog_config
+    if blog_cfg is None or stat != cached_stat:
+        blog_cfg = BlogConfig.loads()
+        _blog_config = (stat, blog_cfg)
+    return blog_cfg
+
+
+def output_snapshot() -> dict:
+    """用于判断是否需要自动刷新页面：源文件及 output 文件夹都算在内。"""
+    snapshot = take_snapshot()
+    snapshot.update(scan_files(Output_Folder_Path, HTML_Suffix, recursive=True))
+    return snapshot
+
+
+class LiveReload:
+    """
+    在一个线程中扫描文件变化，version 每次变化时加一，并通知全部正在等待的连接。
+    没有浏览器连接时不扫描，有浏览器连接后以第一次扫描的结果作为基准。
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.version = 0
+        self.clients = 0
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        snapshot = None
+        while True:
+            time.sleep(Live_Reload_Interval)
+            with self.cond:
+                clients = self.clients
+            if not clients:
+                snapshot = None
+                continue
+            new_snapshot = output_snapshot()
+            if snapshot is not None and new_snapshot != snapshot:
+                with self.cond:
+                    self.version += 1
+                    self.cond.notify_all()
+            snapshot = new_snapshot
+
+    def connect(self) -> int:
+        """:return: 当前的 version"""
+        with self.cond:
+            self.clients += 1
+            return self.version
+
+    def disconnect(self):
+        with self.cond:
+            self.clients -= 1
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """:return: 在 timeout 秒内 version 有变化时返回 True"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.version != version, timeout)
+
+
+live_reload_state = LiveReload()
+
+
+class BokeHandler(SimpleHTTPRequestHandler):
+    live_reload = False
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        if path == Live_Reload_Path and self.live_reload:
+            return self.send_live_reload()
+        if path == "/":
+            path = "/index.html"
+
+        name = path.removeprefix("/")
+        if "/" not in name and name.endswith(HTML_Suffix):
+            md_file = Articles_Folder_Path.joinpath(name).with_suffix(MD_Suffix)
+            if md_file.exists():
+                return self.send_article(md_file)
+
+        html_file = Path(self.translate_path(path))
+        if self.live_reload and name.endswith(HTML_Suffix) and html_file.is_file():
+            html = html_file.read_bytes()
+            etag = hashlib.sha1(html).hexdigest()
+            return self.send_html(etag, html)
+
+        return super().do_GET()
+
+    def send_article(self, md_file):
+        blog_cfg = get_blog_config()
+        err, checksum, render = render_article_in_memory(md_file, blog_cfg)
+        if err:
+            return self.send_error_text(err)
+        if self.not_modified(checksum):
+            return
+        self.send_html(checksum, render().encode("utf-8"))
+
+    def send_error_text(self, err: str):
+        """
+        错误信息可能包含中文，而 send_error() 会把信息放在状态行中 (只能使用 latin-1),
+        因此状态行只使用默认的英文说明，错误信息放在 UTF-8 的正文中。
+        """
+        body = err.encode("utf-8")
+        self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def make_etag(self, checksum: str) -> str:
+        return f'"{checksum}-live"' if self.live_reload else f'"{checksum}"'
+
+    def not_modified(self, checksum: str) -> bool:
+        """如果浏览器缓存的页面仍然有效，则返回 304 及 True"""
+        etag = self.make_etag(checksum)
+        if self.headers.get("If-None-Match") != etag:
+            return False
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def send_html(self, checksum: str, html: bytes):
+        if self.not_modified(checksum):
+            return
+        etag = self.make_etag(checksum)
+        if self.live_reload:
+            html = inject_live_reload(html)
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(html)
+
+    def send_live_reload(self):
+        """Server-Sent Events: 文件发生变化时通知浏览器刷新页面。"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        version = live_reload_state.connect()
+        try:
+            while True:
+                if live_reload_state.wait(version, Live_Reload_Ping):
+                    self.wfile.write(b"data: reload\n\n")
+                    self.wfile.flush()
+                    return
+                # 注释行，用于检测浏览器是否已断开连接
+                self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        finally:
+            live_reload_state.disconnect()
+
+
+def serve_blog(host: str, port: int, live_reload: bool):
+    handler = partial(BokeHandler, directory=str(Output_Folder_Path))
+    BokeHandler.live_reload = live_reload
+    if live_reload:
+        live_reload_state.start()
+    with ThreadingHTTPServer((host, port), handler) as httpd:
+        log.info(f"Serving {Output_Folder_Path} at http://{host}:{port}/")
+        log.info("Press Ctrl-C to stop.")
+        log.flush()
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
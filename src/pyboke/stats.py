@@ -0,0 +1,120 @@
+"""
+渲染过程的统计 (boke render -stats)
+
+记录各个阶段所用的时间及文章数量等计数，默认不启用，不启用时几乎没有额外开销。
+
+各阶段的时间不重复计算：比如渲染首页时 (index) 调用了模板 (template),
+则这段时间只算作 template, 不算作 index.
+"""
+import time
+from collections import Counter
+
+# 注意: stats.py 不可 import 本项目的其他模块
+
+Phases = {
+    "scan":     "查找文件、对比 stat",
+    "hash":     "读取 markdown 并计算 checksum",
+    "toml":     "读取 toml (包括 catalog)",
+    "markdown": "markdown 转换为 HTML",
+    "template": "渲染模板",
+    "write":    "写入文件",
+    "index":    "首页、索引等列表页面 (不包括其中的模板、写入)",
+    "rss":      "RSS (不包括其中的模板、写入)",
+    "search":   "更新搜索索引",
+    "images":   "缩放图片 (output/pics)",
+    "compress": "生成 .gz, .br 压缩文件",
+}
+
+
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.start = 0.0
+        self.times = Counter()
+        self.counts = Counter()
+        self.stack = []  # [[阶段名称, 开始时间]], 用于计算嵌套阶段的时间
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+
+    def phase(self, name):
+        """
+        用法: with stats.phase("markdown"): ...
+        """
+        if not self.enabled:
+            return _null_phase
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] += n
+
+    def take(self):
+        """取出并清空目前的数据 (用于子进程把数据交给主进程)"""
+        data = dict(times=dict(self.times), counts=dict(self.counts))
+        self.times.clear()
+        self.counts.clear()
+        return data
+
+    def merge(self, data):
+        if data:
+            self.times.update(data["times"])
+            self.counts.update(data["counts"])
+
+    def report(self) -> dict:
+        return dict(
+            total_seconds=round(time.perf_counter() - self.start, 4),
+            phases={name: round(self.times.get(name, 0.0), 4) for name in Phases},
+            counts=dict(sorted(self.counts.items())),
+        )
+
+    def print_report(self):
+        report = self.report()
+        print(f"\n总耗时: {report['total_seconds']:.3f} s")
+        for name, seconds in report["phases"].items():
+            print(f"  {name:<9}{seconds:>9.3f} s  {Phases[name]}")
+        for name, n in report["counts"].items():
+            print(f"  {name}: {n}")
+
+
+class _Phase:
+    __slots__ = ("stats", "name")
+
+    def __init__(self, stats: Stats, name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        now = time.perf_counter()
+        stack = self.stats.stack
+        if stack:
+            # 暂停外层阶段的计时
+            outer = stack[-1]
+            self.stats.times[outer[0]] += now - outer[1]
+        stack.append([self.name, now])
+
+    def __exit__(self, *_):
+        now = time.perf_counter()
+        stack = self.stats.stack
+        name, start = stack.pop()
+        self.stats.times[name] += now - start
+        if stack:
+            stack[-1][1] = now  # 恢复外层阶段的计时
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *_):
+        pass
+
+
+_null_phase = _NullPhase()
+
+stats = Stats()
+"""在同一个进程内共用"""
+
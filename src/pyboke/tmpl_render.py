@@ -1,23 +1,45 @@
-from dataclasses import asdict
-from operator import itemgetter
+import codecs
+import hashlib
+import heapq
+import json
+from dataclasses import asdict, replace
+from itertools import chain, repeat
+from operator import attrgetter
 from pathlib import Path
 
-import jinja2
-import mistune
-
-from . import model
+from . import model, md_cache, log, writer, search, images, minify
+from .catalog import get_catalog, file_stat
+from .stats import stats
 from .model import RSS_Atom_XML, Blog_Config_Filename, Blog_Config_Path, \
     Templates_Folder_Path, TOML_Suffix, ArticleConfig, Metadata_Folder_Path, \
     Draft_TMPL_Name, Output_Folder_Path, BlogConfig, HTML_Suffix, TitleIndex, \
-    Title_Index_Length, RSS_Entries_Max, MD_Suffix, RSS_Content_Size, RSS_Path, \
-    Articles_Folder_Path, Temp_HTML_Path
+    Title_Index_Length, MD_Suffix, Article, RSS_Path, \
+    Articles_Folder_Path, Temp_HTML_Path, Years_Folder_Path, Indexes_Folder_Path, \
+    Pages_Folder_Path, Pages_Folder_Name, Templates_Cache_Path, MD_Cache_Spare, \
+    Pics_Folder_Name, Theme_CSS_Path, Themes_Folder_Path, Style_CSS_Name, Random_JSON_Name, \
+    Random_JSON_Path, Package_Tmpl_Path
 
 # 注意: tmpl_render.py 不能 import util.py
 
-loader = jinja2.FileSystemLoader(Templates_Folder_Path)
-jinja_env = jinja2.Environment(
-    loader=loader, autoescape=jinja2.select_autoescape()
-)
+_jinja_env = None
+
+
+def get_jinja_env():
+    """
+    第一次需要渲染模板时才生成 Jinja 环境（比如 boke new 就不需要）。
+    编译后的模板缓存在 Templates_Cache_Path, 模板文件的内容变化后缓存自动失效。
+    """
+    global _jinja_env
+    if _jinja_env is None:
+        import jinja2
+
+        Templates_Cache_Path.mkdir(parents=True, exist_ok=True)
+        _jinja_env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(Templates_Folder_Path),
+            autoescape=jinja2.select_autoescape(),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(str(Templates_Cache_Path)),
+        )
+    return _jinja_env
 
 # 渲染时，除了 tmplfile 之外, templates 文件夹里的全部文件都会被复制到 output 文件夹。
 tmplfile = dict(
@@ -30,15 +52,62 @@ tmplfile = dict(
     article     = "article.html",
     random      = "random.html",
     title_index = "title-index.html",
+    search      = "search.html",
     rss         = RSS_Atom_XML,
 )
 
 
+_pending_blog_cfg = None
+"""有变化但尚未写入 blog.toml 的 BlogConfig"""
+
+
 def render_blog_config(cfg):
-    tmpl = jinja_env.get_template(tmplfile["blog_cfg"])
-    blog_toml = tmpl.render(dict(cfg=cfg))
-    print(f"render and write {Blog_Config_Path}")
-    Blog_Config_Path.write_text(blog_toml, encoding="utf-8")
+    """
+    只记录 blog.toml 需要更新，并不立即写入。
+    一个命令可能多次修改 BlogConfig (比如 blog_updated 和 rss_updated),
+    全部修改由 flush_blog_config() 在命令结束时一次写入。
+    """
+    global _pending_blog_cfg
+    _pending_blog_cfg = cfg
+
+
+def flush_blog_config() -> bool:
+    """
+    把 render_blog_config() 记录的 BlogConfig 写入 blog.toml.
+    只在内容有变化时写入，先写临时文件再改名，避免写到一半被中断。
+
+    :return: 是否写入了文件
+    """
+    global _pending_blog_cfg
+    cfg, _pending_blog_cfg = _pending_blog_cfg, None
+    if cfg is None:
+        return False
+    return writer.write_if_changed(Blog_Config_Path, blog_config_toml(cfg))
+
+
+def blog_config_toml(cfg) -> str:
+    """
+    使用 templates/blog.toml 渲染 blog.toml 的内容。
+    旧博客的 templates/blog.toml 可能缺少新增的项目 (比如 split_listing),
+    直接使用会使这些设定在写入时丢失，因此缺少项目时改用 pyboke 安装包中的模板。
+    """
+    env = get_jinja_env()
+    data = dict(cfg=cfg)
+    text = env.get_template(tmplfile["blog_cfg"]).render(data)
+    try:
+        missing = asdict(cfg).keys() - model.tomllib.loads(text).keys()
+    except ValueError:
+        missing = asdict(cfg).keys()
+    if not missing:
+        return text
+
+    log.warning(
+        f"templates/{tmplfile['blog_cfg']} 缺少 {', '.join(sorted(missing))}, "
+        f"已改用 pyboke 自带的模板写入 blog.toml "
+        f"(请从 {Package_Tmpl_Path} 复制新版 {tmplfile['blog_cfg']} 到 templates 文件夹)",
+        event="old_template", missing=sorted(missing))
+    packaged = Package_Tmpl_Path.joinpath(tmplfile["blog_cfg"])
+    return env.from_string(packaged.read_text(encoding="utf-8")).render(data)
 
 
 def blog_updated_at_now(cfg):
@@ -49,75 +118,113 @@ def blog_updated_at_now(cfg):
 
 def render_rss(all_articles, cfg, force):
     if cfg.blog_updated > cfg.rss_updated or force:
-        rss_arts = get_rss_articles(all_articles)
-        really_render_rss(rss_arts, cfg, force)
+        rss_arts = get_recent_articles(all_articles, cfg.rss_entries_max, key="mtime")
+        deps = [blog_deps(cfg), [
+            (art.id, art.title, art.author, art.ctime,
+             art.mtime, art.checksum) for art in rss_arts
+        ]]
+        with stats.phase("rss"):
+            if not force and not page_changed("rss", RSS_Path, deps):
+                return
+            really_render_rss(add_rss_content(rss_arts, cfg.rss_content_size), cfg, force)
+            set_page_digest(RSS_Path, page_digest("rss", deps))
 
 
 def really_render_rss(articles, blog_cfg, force):
     """如果不强制渲染，则只在已经存在 RSS (atom.xml) 时才渲染。"""
     if not force and not RSS_Path.exists():
         return
-    tmpl = jinja_env.get_template(tmplfile["rss"])
-    xml = tmpl.render(dict(blog=blog_cfg, entries=articles))
-    print(f"render and write {RSS_Path}")
-    RSS_Path.write_text(xml, encoding="utf-8")
+    tmpl = get_jinja_env().get_template(tmplfile["rss"])
+    stream = tmpl.stream(dict(blog=blog_cfg, entries=articles))
+    writer.stream_write_if_changed(RSS_Path, stream)
     blog_cfg.rss_updated = model.now()
     render_blog_config(blog_cfg)
 
 
-def get_rss_articles(all_articles):
+def add_rss_content(recent_arts, size):
     """
-    按文章的修改时间排列。
-    all_articles 是一个 dict, 已经有 id, 详见 get_all_articles()
+    获取文章摘要。摘要缓存在 catalog 中，只在文章的 checksum 变化时才重新读取文件。
+
+    :return: 新的 Article 列表 (填写了 content)
     """
-    sorted_articles = sort_articles(all_articles, key="mtime")
-    recent_arts = get_recent_articles(sorted_articles, RSS_Entries_Max)
+    catalog = get_catalog()
+    result = []
     for art in recent_arts:
-        md_file = Articles_Folder_Path.joinpath(f"{art['id']}{MD_Suffix}")
-        content = md_file.read_text(encoding="utf-8")
-        if len(content) > RSS_Content_Size:
-            content = content[:RSS_Content_Size] + "..."
-        art["content"] = content
-    return recent_arts
+        content = catalog.get_summary(art.id, art.checksum, size)
+        if content is None:
+            md_file = Articles_Folder_Path.joinpath(f"{art.id}{MD_Suffix}")
+            content = read_summary(md_file, size)
+            catalog.set_summary(art.id, art.checksum, size, content)
+        result.append(replace(art, content=content))
+    return result
 
 
-def get_all_articles():
-    """注意返回的不是 ArticleConfig, 而是 dict"""
-    articles = Metadata_Folder_Path.glob(f"*{TOML_Suffix}")
-    arts = []
-    for art_path in articles:
-        art = ArticleConfig.loads(art_path)
-        art = asdict(art)
-        art["id"] = art_path.stem
-        arts.append(art)
-    return arts
+def read_summary(md_file: Path, size: int) -> str:
+    """
+    只读取文件开头的一部分，截取前 size 个字符作为摘要。
+    一个 UTF-8 字符最多 4 个字节，因此读取 (size+1)*4 个字节即可判断是否需要截断。
+    """
+    with open(md_file, "rb") as f:
+        data = f.read((size + 1) * 4)
+    # final=False: 末尾不完整的 UTF-8 字符会被丢弃，而不是报错
+    content = codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    content = content.replace("\r\n", "\n").replace("\r", "\n")
+    if len(content) > size:
+        content = content[:size] + "..."
+    return content
 
 
-def ignore_articles(articles):
-    return [art for art in articles if not art["ignored"]]
+def get_all_articles():
+    """
+    注意返回的不是 ArticleConfig, 而是只读的 Article.
+    数据来自 catalog.json, 只有发生变化的 toml 文件才会被重新读取。
+    """
+    with stats.phase("toml"):
+        catalog = get_catalog().sync()
+        catalog.save()
+    for err in catalog.errors:
+        log.warning(err)
+    catalog.errors.clear()
+    return catalog.articles()
 
 
 def sort_articles(articles, key):
-    return sorted(articles, key=itemgetter(key), reverse=True)
+    return sorted(articles, key=attrgetter(key), reverse=True)
+
 
 def get_all_html_filenames(all_articles):
-    return [art["id"]+HTML_Suffix for art in all_articles]
+    return [art.id+HTML_Suffix for art in all_articles]
 
 
-def get_recent_articles(sorted_articles, n):
-    return sorted_articles[:n]
+def get_recent_articles(articles, n, key):
+    """
+    按 key 从大到小取前 n 篇文章。
+    使用 heapq.nlargest, 不需要对全部文章排序，结果与 sort_articles(...)[:n] 相同。
+    """
+    return heapq.nlargest(n, articles, key=attrgetter(key))
 
 
-def get_articles_in_years(sorted_articles):
-    """获取全部年份的全部文章"""
+def get_articles_in_years(articles):
+    """
+    获取全部年份的全部文章（不包括被忽略的文章）。
+    只遍历一次全部文章进行分组，然后分别对每一年的文章排序，
+    因此把各年份的文章依次连接起来就是按 ctime 从新到旧排列的全部文章。
+
+    :return: dict(yyyy, articles), 年份从新到旧排列
+    """
     arts = {}
-    for art in sorted_articles:
-        yyyy = art["ctime"][:4]
+    for art in articles:
+        if art.ignored:
+            continue
+        yyyy = art.ctime[:4]
         if yyyy in arts:
             arts[yyyy].append(art)
         else:
             arts[yyyy] = [art]
-    return arts
+    return {
+        yyyy: sort_articles(arts[yyyy], key="ctime")
+        for yyyy in sorted(arts, reverse=True)
+    }
 
 
 def get_title_indexes(sorted_articles):
@@ -126,14 +233,13 @@ def get_title_indexes(sorted_articles):
     """
     indexes = {}
     for art in sorted_articles:
-        index = art["title"][:Title_Index_Length]
+        index = art.title[:Title_Index_Length]
         if index in indexes:
             indexes[index].articles.append(art)
         else:
-            index_id = index.encode().hex()
             indexes[index] = TitleIndex(
                 name=index,
-                id=f"i{index_id}",
+                id=art.index_id,
                 articles=[art]
             )
     return indexes
@@ -144,7 +250,7 @@ def sort_by_title_index(indexes: dict) -> list:
     result = []
     for key in keys:
         item = indexes[key]
-        item.articles = sorted(item.articles, key=itemgetter("title"))
+        item.articles = sorted(item.articles, key=attrgetter("title"))
         result.append(item)
     return result
 
@@ -152,37 +258,260 @@ def sort_by_title_index(indexes: dict) -> list:
 def render_write_html(page_name: str, data: dict, output_path: Path = None):
     if output_path is None:
         output_path = Output_Folder_Path.joinpath(tmplfile[page_name])
-    tmpl = jinja_env.get_template(tmplfile[page_name])
-    html = tmpl.render(data)
-    print(f"render and write {output_path}")
-    output_path.write_text(html, encoding="utf-8")
+    with stats.phase("template"):
+        tmpl = get_jinja_env().get_template(tmplfile[page_name])
+        html = tmpl.render(data)
+    if data["blog"].minify:
+        html = minify.minify_html(html)
+    writer.write_if_changed(output_path, html)
+
 
+def blog_deps(blog_cfg):
+    """
+    列表页面所依赖的博客设定。
+    不包括 blog_updated 和 rss_updated, 因为它们每次更新文章都会改变。
+    """
+    deps = asdict(blog_cfg)
+    del deps["blog_updated"], deps["rss_updated"]
+    return deps
 
-def render_title_index(all_articles, blog_cfg):
-    indexes = get_title_indexes(all_articles)
-    render_write_html("title_index", dict(
+
+def page_digest(page_name: str, deps) -> str:
+    """根据页面的模板文件 (及 base.html) 的 stat 与页面的输入数据计算摘要"""
+    tmpl_stats = [
+        file_stat(Templates_Folder_Path.joinpath(tmplfile[name]))
+        for name in (page_name, "base")
+    ]
+    text = json.dumps([tmpl_stats, deps], ensure_ascii=False)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def page_changed(page_name: str, output_path: Path, deps) -> bool:
+    """如果页面的输入数据与上次渲染时相同，并且输出文件仍存在，则返回 False"""
+    name = output_path.relative_to(Output_Folder_Path).as_posix()
+    digest = get_catalog().pages.get(name)
+    return digest != page_digest(page_name, deps) or not output_path.exists()
+
+
+def set_page_digest(output_path: Path, digest: str):
+    name = output_path.relative_to(Output_Folder_Path).as_posix()
+    get_catalog().set_page(name, digest)
+
+
+def render_listing_page(
+        page_name: str, deps, data: dict, force: bool, output_path: Path = None):
+    """
+    渲染索引、首页等列表页面。
+    只在页面的输入数据 deps 发生变化时（或强制渲染时）才重新渲染。
+    """
+    if output_path is None:
+        output_path = Output_Folder_Path.joinpath(tmplfile[page_name])
+    if not force and not page_changed(page_name, output_path, deps):
+        return
+    output_path.parent.mkdir(exist_ok=True)
+    render_write_html(page_name, data, output_path)
+    set_page_digest(output_path, page_digest(page_name, deps))
+
+
+def remove_stale_pages(folders, current_pages):
+    """
+    删除拆分页面中已经不再需要的页面（比如某个年份的文章已全部删除）。
+
+    :param folders: 拆分页面所在的文件夹，比如 [Years_Folder_Path]
+    :param current_pages: 本次渲染时需要的全部拆分页面的 Path
+    """
+    current = {page.relative_to(Output_Folder_Path).as_posix() for page in current_pages}
+    prefixes = tuple(
+        folder.relative_to(Output_Folder_Path).as_posix() + "/" for folder in folders)
+    catalog = get_catalog()
+    for name in list(catalog.pages):
+        if name.startswith(prefixes) and name not in current:
+            page = Output_Folder_Path.joinpath(name)
+            log.debug(f"DELETE {page}", event="delete", path=str(page))
+            writer.remove(page, missing_ok=True)
+            catalog.remove_page(name)
+
+
+def render_split_title_index(indexes: dict, blog_cfg, force=False):
+    """
+    拆分标题索引：title-index.html 只包含索引字列表，
+    每个索引字的文章列表分别放在 title-index/{index_id}.html
+
+    :return: 全部拆分页面的 Path
+    """
+    indexes = sort_by_title_index(indexes)
+    index_links = [TitleIndex(name=item.name, id=item.id, articles=[]) for item in indexes]
+    links_deps = [(item.name, item.id) for item in index_links]
+    render_listing_page("title_index", [blog_deps(blog_cfg), links_deps], dict(
+        indexes=[],
+        index_links=index_links,
+        blog=blog_cfg,
+        parent_dir=""
+    ), force)
+
+    pages = []
+    for item in indexes:
+        output_path = Indexes_Folder_Path.joinpath(f"{item.id}{HTML_Suffix}")
+        deps = [blog_deps(blog_cfg), links_deps, [
+            (art.id, art.title) for art in item.articles
+        ]]
+        render_listing_page("title_index", deps, dict(
+            indexes=[item],
+            index_links=index_links,
+            blog=blog_cfg,
+            parent_dir="../"
+        ), force, output_path)
+        pages.append(output_path)
+    return pages
+
+
+def render_split_years(year_articles, blog_cfg, force=False):
+    """
+    拆分年份页面：years.html 只包含年份列表，
+    每一年的文章列表分别放在 years/{yyyy}.html
+
+    :return: 全部拆分页面的 Path
+    """
+    year_links = [dict(year=year, count=len(arts)) for year, arts in year_articles.items()]
+    render_listing_page("years", [blog_deps(blog_cfg), year_links], dict(
+        year_articles={},
+        year_links=year_links,
+        blog=blog_cfg,
+        parent_dir=""
+    ), force)
+
+    pages = []
+    for year, arts in year_articles.items():
+        output_path = Years_Folder_Path.joinpath(f"{year}{HTML_Suffix}")
+        deps = [blog_deps(blog_cfg), [(art.id, art.title, art.ctime) for art in arts]]
+        render_listing_page("years", deps, dict(
+            year_articles={year: arts},
+            blog=blog_cfg,
+            parent_dir="../"
+        ), force, output_path)
+        pages.append(output_path)
+    return pages
+
+
+def render_home_pages(sorted_articles, blog_cfg, force=False):
+    """
+    把首页以外的文章按每页 home_recent_max 篇分页，放在 page/{n}.html
+
+    注意：从最旧的文章开始编号 (page/1.html 是最旧的一页)，
+    因此添加新文章时通常只会影响最新的一页，不会导致全部分页都要重新渲染。
+
+    :return: 全部拆分页面的 Path
+    """
+    n = blog_cfg.home_recent_max
+    older_arts = sorted_articles[n:][::-1]
+    count = (len(older_arts) + n - 1) // n
+    pages = []
+    for i in range(count):
+        page_no = i + 1
+        arts = older_arts[i*n : page_no*n][::-1]
+        pager = dict(
+            newer="../index.html" if page_no == count else f"{page_no+1}{HTML_Suffix}",
+            older=f"{page_no-1}{HTML_Suffix}" if page_no > 1 else "",
+        )
+        output_path = Pages_Folder_Path.joinpath(f"{page_no}{HTML_Suffix}")
+        deps = [blog_deps(blog_cfg), pager, [
+            (art.id, art.title, art.ctime) for art in arts
+        ]]
+        render_listing_page("index", deps, dict(
+            blog=blog_cfg,
+            articles=arts,
+            pager=pager,
+            parent_dir="../"
+        ), force, output_path)
+        pages.append(output_path)
+    return pages
+
+
+def render_title_index(indexes: dict, blog_cfg, force=False):
+    deps = [blog_deps(blog_cfg), [
+        (art.id, art.title) for item in indexes.values() for art in item.articles
+    ]]
+    render_listing_page("title_index", deps, dict(
         indexes=sort_by_title_index(indexes),
         blog=blog_cfg,
         parent_dir=""
-    ))
+    ), force)
 
 
-def render_index_html(recent_articles, html_filenames, blog_cfg):
-    render_write_html("index", dict(
+def render_random_json(all_articles) -> str:
+    """
+    把全部文章的 id (排序后，不含 .html) 写入 output/random.json, 供 random.html 读取。
+    文章有增减时才会改变，因此浏览器可以长期缓存。
+
+    :return: random.json 带版本号的地址，比如 "random.json?v=1a2b3c4d5e6f"
+    """
+    data = json.dumps(sorted(art.id for art in all_articles), separators=(",", ":"))
+    writer.write_if_changed(Random_JSON_Path, data)
+    version = hashlib.sha1(data.encode()).hexdigest()[:12]
+    return f"{Random_JSON_Name}?v={version}"
+
+
+def render_index_html(
+        recent_articles, html_filenames, blog_cfg, force=False, pager=None, random_url=""):
+    deps = [blog_deps(blog_cfg), pager, [
+        (art.id, art.title, art.ctime) for art in recent_articles
+    ]]
+    render_listing_page("index", deps, dict(
         blog=blog_cfg,
         articles=recent_articles,
         files=html_filenames,
+        pager=pager,
         parent_dir=""
-    ))
-    render_write_html("random", dict(blog=blog_cfg, files=html_filenames))
+    ), force)
+    # 旧版本的 random.html 模板直接使用 files, 新版本只使用 random_url
+    deps = [blog_deps(blog_cfg), random_url]
+    render_listing_page("random", deps, dict(
+        blog=blog_cfg, files=html_filenames, random_url=random_url), force)
+
+
+def render_search_html(blog_cfg, force=False):
+    # 旧版本的博客的 templates 文件夹里没有 search.html
+    if not Templates_Folder_Path.joinpath(tmplfile["search"]).exists():
+        return
+    render_listing_page(
+        "search", blog_deps(blog_cfg), dict(blog=blog_cfg, parent_dir=""), force)
 
 
-def render_years_html(year_articles, blog_cfg):
-    render_write_html("years", dict(
+def render_css(blog_cfg, force=False):
+    """
+    把当前主题的 CSS 及 templates/style.css 复制到 output, minify 为真时压缩其内容。
+    只在源文件、主题或 minify 设定有变化时才处理 (记录在 catalog 的 pages 中)。
+    """
+    sources = {
+        Theme_CSS_Path: Themes_Folder_Path.joinpath(f"{blog_cfg.current_theme}.css"),
+        Output_Folder_Path.joinpath(Style_CSS_Name): Templates_Folder_Path.joinpath(Style_CSS_Name),
+    }
+    pages = get_catalog().pages
+    for output_path, src in sources.items():
+        deps = [src.name, file_stat(src), blog_cfg.minify]
+        if deps[1] is None:
+            continue
+        digest = hashlib.sha1(json.dumps(deps).encode()).hexdigest()
+        name = output_path.relative_to(Output_Folder_Path).as_posix()
+        if not force and pages.get(name) == digest and output_path.exists():
+            continue
+        css = src.read_text(encoding="utf-8")
+        if blog_cfg.minify:
+            css = minify.minify_css(css)
+        writer.write_if_changed(output_path, css)
+        set_page_digest(output_path, digest)
+
+
+def render_years_html(year_articles, blog_cfg, force=False):
+    deps = [blog_deps(blog_cfg), [
+        (art.id, art.title, art.ctime)
+        for arts in year_articles.values() for art in arts
+    ]]
+    render_listing_page("years", deps, dict(
         year_articles=year_articles,
         blog=blog_cfg,
         parent_dir=""
-    ))
+    ), force)
 
 
 def replace_or_not(art_cfg : ArticleConfig, blog_cfg: BlogConfig):
@@ -195,91 +524,299 @@ def replace_or_not(art_cfg : ArticleConfig, blog_cfg: BlogConfig):
             return True
 
 
+def markdown_to_html(
+        md_text: str, art_cfg: ArticleConfig, pairs: list, srcsets: dict = None) -> str:
+    """
+    把 markdown 转换为 HTML 片段。结果缓存在 .boke-cache/markdown,
+    文章内容 (checksum)、替换规则、图片的 srcset 及 mistune 版本都不变时直接使用缓存。
+
+    注意: art_cfg.checksum 必须是 md_text 的 checksum.
+    """
+    from . import md_render
+
+    with stats.phase("markdown"):
+        key = md_cache.cache_key(
+            art_cfg.checksum, pairs, md_render.Cache_Version, srcsets)
+        if (html := md_cache.get_html(key)) is not None:
+            stats.count("markdown_cache_hits")
+            return html
+
+        html = md_render.markdown_to_html(md_text, pairs, srcsets, f"{Pics_Folder_Name}/")
+        md_cache.put_html(key, html)
+        stats.count("markdown_converted")
+        return html
+
+
+def prune_md_cache(force: bool = False):
+    """缓存数量上限随文章数量增加，避免强制渲染全部文章时缓存不够用。"""
+    md_cache.prune(len(get_catalog().entries) + MD_Cache_Spare, force)
+
+
+def article_html(
+        art_id: str, md_text: str, blog_cfg: BlogConfig, art_cfg: ArticleConfig) -> str:
+    """
+    把一篇文章渲染为 HTML (blog_cfg.minify 为真时压缩空白), 只返回结果，不写入文件。
+    写入 output 与 boke serve 都使用这里的结果，因此两者的内容相同。
+    """
+    pairs = art_cfg.pairs if replace_or_not(art_cfg, blog_cfg) else []
+    srcsets = images.srcset_map(md_text) if blog_cfg.img_widths else None
+    content = markdown_to_html(md_text, art_cfg, pairs, srcsets)
+    art = Article.from_config(art_id, art_cfg, content=content)
+    with stats.phase("template"):
+        tmpl = get_jinja_env().get_template(tmplfile["article"])
+        html = tmpl.render(dict(blog=blog_cfg, art=art, parent_dir=""))
+    if blog_cfg.minify:
+        html = minify.minify_html(html)
+    return html
+
+
+Article_Blog_Deps = (
+    "name", "author", "website", "rss_link",
+    "img_max_width", "split_listing", "minify", "auto_replace",
+)
+"""
+文章页面所依赖的博客设定 (article.html, base.html 及 article_html() 用到的项目)。
+img_widths 不在其中，因为图片缩放的变化已由 images.signatures() 判断。
+"""
+
+
+def article_deps(blog_cfg: BlogConfig) -> str:
+    """
+    文章页面所依赖的模板 (article.html, base.html) 及博客设定的摘要，记录在 catalog 中。
+    这些有变化时 (比如 split_listing 改变了索引页面的地址), 即使文章内容不变也要重新渲染。
+    只改变 RSS、首页等设定 (比如 rss_entries_max) 时不需要重新渲染文章。
+    """
+    deps = {key: getattr(blog_cfg, key) for key in Article_Blog_Deps}
+    return page_digest("article", deps)
+
+
 def render_article_html(
         html_path : Path,
         md_text : str,
         blog_cfg: BlogConfig,
         art_cfg : ArticleConfig,
 ):
-    if replace_or_not(art_cfg, blog_cfg):
-        for pair in art_cfg.pairs:
-            md_text = md_text.replace(pair[0], pair[1], 1)
-
-    art = asdict(art_cfg)
-    index_id = art["title"][:Title_Index_Length].encode().hex()
-    art["index_id"] = f"i{index_id}"
-    art["content"] = mistune.html(md_text)
-    render_write_html(
-        "article", dict(blog=blog_cfg, art=art, parent_dir=""), html_path)
+    html = article_html(html_path.stem, md_text, blog_cfg, art_cfg)
+    writer.write_if_changed(html_path, html)
 
 
 def delete_articles(all_md_files):
     """
     :return: 删除的文件的数量 len(to_be_delete)
     """
-    all_id = [file.stem for file in all_md_files]
+    all_id = {file.stem for file in all_md_files}
     all_metadata = Metadata_Folder_Path.glob(f"*{TOML_Suffix}")
-    to_be_delete = [file for file in all_metadata if file.stem not in all_id]
-    result = len(to_be_delete)
-    if result == 0:
-        return 0
-
-    for file in to_be_delete:
-        print(f"DELETE {file}")
-        file.unlink()
+    to_be_delete = [file.stem for file in all_metadata if file.stem not in all_id]
+    return delete_articles_by_id(to_be_delete)
+
+
+def delete_articles_by_id(art_ids):
+    """
+    删除 markdown 文件已不存在的文章的 toml 和 html
+
+    :return: 删除的文章的数量
+    """
+    catalog = get_catalog()
+    result = 0
+    for art_id in art_ids:
+        file = Metadata_Folder_Path.joinpath(f"{art_id}{TOML_Suffix}")
+        if not file.exists():
+            continue
+        log.info(f"DELETE {file}", event="delete", path=str(file))
+        writer.remove(file)
+        catalog.remove(art_id)
         html_path = html_path_from_md_path(file)
-        print(f"DELETE {html_path}")
-        html_path.unlink()
+        log.info(f"DELETE {html_path}", event="delete", path=str(html_path))
+        writer.remove(html_path, missing_ok=True)
+        result += 1
 
     return result
 
 
 def update_index_rss(blog_cfg, force=False):
+    """
+    更新 RSS 及首页、索引等列表页面。
+    每个页面只在其依赖的文章数据发生变化时才重新渲染，force 为真时全部重新渲染。
+    """
     all_arts = get_all_articles()
+    if render_stale_articles(all_arts, blog_cfg):
+        all_arts = get_all_articles()
     render_rss(all_arts, blog_cfg, force=force)
 
-    all_arts = ignore_articles(all_arts)
-    all_arts = sort_articles(all_arts, key="ctime")
+    with stats.phase("index"):
+        # 各个列表页面共用同一份排好序的文章列表，不重复排序
+        arts_in_years = get_articles_in_years(all_arts)
+        all_arts = list(chain.from_iterable(arts_in_years.values()))
+        recent_arts = all_arts[:blog_cfg.home_recent_max]
+        html_filenames = get_all_html_filenames(all_arts)
+        random_url = render_random_json(all_arts)
+        indexes = get_title_indexes(all_arts)
+
+        split_pages = []
+        if blog_cfg.split_listing:
+            split_pages += render_home_pages(all_arts, blog_cfg, force)
+            pager = None
+            if split_pages:
+                older = f"{Pages_Folder_Name}/{len(split_pages)}{HTML_Suffix}"
+                pager = dict(newer="", older=older)
+            render_index_html(
+                recent_arts, html_filenames, blog_cfg, force, pager, random_url)
+            split_pages += render_split_years(arts_in_years, blog_cfg, force)
+            split_pages += render_split_title_index(indexes, blog_cfg, force)
+        else:
+            render_index_html(
+                recent_arts, html_filenames, blog_cfg, force, random_url=random_url)
+            render_years_html(arts_in_years, blog_cfg, force)
+            render_title_index(indexes, blog_cfg, force)
+
+        remove_stale_pages(
+            [Pages_Folder_Path, Years_Folder_Path, Indexes_Folder_Path], split_pages)
+        search.update_index(all_arts)
+        render_search_html(blog_cfg, force)
+        render_css(blog_cfg, force)
+    prune_md_cache()
+    get_catalog().save()
 
-    recent_arts = get_recent_articles(all_arts, blog_cfg.home_recent_max)
-    html_filenames = get_all_html_filenames(all_arts)
-    render_index_html(recent_arts, html_filenames, blog_cfg)
-    arts_in_years = get_articles_in_years(all_arts)
-    render_years_html(arts_in_years, blog_cfg)
-    render_title_index(all_arts, blog_cfg)
 
+def render_stale_articles(all_articles, blog_cfg) -> int:
+    """
+    重新渲染 article_deps() 有变化的文章 (比如执行 boke render -index 时 split_listing 已改变),
+    使文章页面中的链接与列表页面一致。通常没有这样的文章，只需要比较 catalog 中的记录。
 
-def render_all_articles(blog_cfg: BlogConfig, force: bool):
+    :return: 内容也有变化 (need_to_render) 的文章数量
     """
+    deps = article_deps(blog_cfg)
+    catalog = get_catalog()
+    updated = 0
+    for art in all_articles:
+        if catalog.get_deps(art.id) == deps:
+            continue
+        md_file = Articles_Folder_Path.joinpath(f"{art.id}{MD_Suffix}")
+        if not md_file.exists():
+            continue
+        err, need_to_render = add_or_update_article(md_file, blog_cfg, False, deps)
+        if err:
+            log.warning(err)
+        if need_to_render:
+            updated += 1
+    return updated
+
+
+def render_all_articles(blog_cfg: BlogConfig, force: bool, jobs: int = 1):
+    """
+    :param jobs: 进程数，大于 1 时使用多个进程并行渲染文章。
     :return: 发生错误时返回 err_msg: str, 没有错误则返回 False 或空字符串。
+             遇到错误时不会中止，而是继续处理其他文章，最后汇总全部错误。
     """
-    all_md_files = Articles_Folder_Path.glob(f"*{MD_Suffix}")
-    all_md_files = list(all_md_files)
-    deleted_count = delete_articles(all_md_files)
+    with stats.phase("scan"):
+        all_md_files = Articles_Folder_Path.glob(f"*{MD_Suffix}")
+        all_md_files = list(all_md_files)
+        deleted_count = delete_articles(all_md_files)
+    images.update(blog_cfg.img_widths)
+    deps = article_deps(blog_cfg)
+    catalog = get_catalog()
+    deps_changed = any(catalog.get_deps(art_id) != deps for art_id in catalog.entries)
+
+    if jobs > 1 and len(all_md_files) > 1:
+        results = add_or_update_in_pool(all_md_files, blog_cfg, force, jobs, deps)
+    else:
+        results = (
+            try_add_or_update_article(md_file, blog_cfg, force, deps)
+            for md_file in all_md_files
+        )
 
+    errors = []
     updated_articles = 0
-    for md_file in all_md_files:
-        err, need_to_render = add_or_update_article(md_file, blog_cfg, force)
+    for err, need_to_render in log.progress(results, len(all_md_files), "render"):
         if err:
-            return err
+            errors.append(err)
         if need_to_render:
             updated_articles += 1
 
+    stats.count("articles", len(all_md_files))
+    stats.count("articles_updated", updated_articles)
+    stats.count("articles_deleted", deleted_count)
+    stats.count("errors", len(errors))
+    log.info(
+        f"共 {len(all_md_files)} 篇文章，更新 {updated_articles} 篇，删除 {deleted_count} 篇",
+        event="summary", articles=len(all_md_files), updated=updated_articles,
+        deleted=deleted_count, errors=len(errors),
+    )
+
     if force or deleted_count + updated_articles > 0:
         blog_updated_at_now(blog_cfg)
         update_index_rss(blog_cfg)
+    elif deps_changed:
+        # 模板或博客设定有变化 (比如 split_listing), 列表页面也可能需要更新
+        update_index_rss(blog_cfg)
 
-    return False
+    # 使用多个进程时，缓存由子进程写入
+    prune_md_cache(force=jobs > 1)
+    get_catalog().save()
+    return "\n".join(errors)
+
+
+def init_worker(stats_enabled: bool, log_options: dict):
+    """进程池的 initializer, 使子进程与主进程的设定一致。"""
+    stats.enable(stats_enabled)
+    log.setup(**log_options)
+    # fork 出来的子进程继承了主进程已有的统计与文件变化记录，
+    # 若不清空，它们会随第一个结果被重复合并到主进程。
+    stats.take()
+    writer.changes.take()
+
+
+def add_or_update_in_worker(md_file: Path, blog_cfg: BlogConfig, force: bool, deps: str):
+    """在子进程中执行 add_or_update_article(), 并把 catalog 条目交给主进程。"""
+    entries = get_catalog().entries
+    old_entry = entries.get(md_file.stem)
+    err, need_to_render = try_add_or_update_article(md_file, blog_cfg, force, deps)
+    entry = entries.get(md_file.stem)
+    if entry is old_entry:
+        entry = None
+    return md_file.stem, err, need_to_render, entry, stats.take(), writer.changes.take()
+
+
+def add_or_update_in_pool(
+        all_md_files, blog_cfg: BlogConfig, force: bool, jobs: int, deps: str):
+    """
+    用进程池并行处理全部文章，由主进程统一更新 catalog.
+
+    :return: 逐个返回与 add_or_update_article() 的返回值相同的 (err, need_to_render)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(all_md_files) // (jobs * 4))
+    catalog = get_catalog()
+    # 子进程的统计数据及写入的文件列表随结果一起交给主进程，
+    # 因此各阶段的时间是全部进程的合计
+    with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(stats.enabled, log.options())
+    ) as executor:
+        for art_id, err, need_to_render, entry, worker_stats, changes in executor.map(
+            add_or_update_in_worker,
+            all_md_files,
+            repeat(blog_cfg),
+            repeat(force),
+            repeat(deps),
+            chunksize=chunksize,
+        ):
+            if entry is not None:
+                catalog.put_entry(art_id, entry)
+            stats.merge(worker_stats)
+            writer.changes.merge(changes)
+            yield err, need_to_render
 
 
 def delete_article(md_path, toml_path, blog_cfg):
-    print(f"DELETE {md_path}")
-    md_path.unlink()
-    print(f"DELETE {toml_path}")
-    toml_path.unlink()
+    log.info(f"DELETE {md_path}", event="delete", path=str(md_path))
+    writer.remove(md_path)
+    log.info(f"DELETE {toml_path}", event="delete", path=str(toml_path))
+    writer.remove(toml_path)
+    get_catalog().remove(md_path.stem)
     html_path = html_path_from_md_path(md_path)
-    print(f"DELETE {html_path}")
-    html_path.unlink()
+    log.info(f"DELETE {html_path}", event="delete", path=str(html_path))
+    writer.remove(html_path)
     blog_updated_at_now(blog_cfg)
     update_index_rss(blog_cfg)
 
@@ -288,6 +825,7 @@ def render_article(md_file: Path, blog_cfg: BlogConfig, force: bool):
     """
     :return: 发生错误时返回 err_msg: str, 没有错误则返回 False 或空字符串。
     """
+    images.update(blog_cfg.img_widths)
     err, need_to_render = add_or_update_article(md_file, blog_cfg, force)
 
     if err:
@@ -296,6 +834,8 @@ def render_article(md_file: Path, blog_cfg: BlogConfig, force: bool):
     if need_to_render:
         blog_updated_at_now(blog_cfg)
         update_index_rss(blog_cfg)
+    else:
+        get_catalog().save()  # 比如强制渲染时记录的图片签名
 
     return False
 
@@ -303,45 +843,128 @@ def render_article(md_file: Path, blog_cfg: BlogConfig, force: bool):
 def preview_article(md_file: Path, blog_cfg: BlogConfig):
     """只渲染一个文件，不执行 update_index_rss() """
     md_data = md_file.read_bytes()
-    art_toml_path = art_cfg_path_from_md_path(md_file)
-    if art_toml_path.exists():
-        art_cfg = ArticleConfig.loads(art_toml_path)
-    else:
-        art_cfg, err = ArticleConfig.from_md_file(md_file, md_data, blog_cfg.title_length_max)
-        if err:
-            return err
+    art_cfg, err = preview_article_config(md_file, md_data, blog_cfg)
+    if err:
+        return err
 
     art_cfg.mtime = model.now()
+    art_cfg.checksum = hashlib.sha1(md_data).hexdigest()
     render_article_html(Temp_HTML_Path, md_data.decode(), blog_cfg, art_cfg)
+    prune_md_cache()
 
 
-def add_or_update_article(md_file: Path, blog_cfg: BlogConfig, force: bool):
+def preview_article_config(md_file: Path, md_data: bytes, blog_cfg: BlogConfig):
+    """
+    如果文章已有 toml 则使用该 toml, 否则临时生成一个 ArticleConfig (不写入文件)。
+
+    :return: (ArticleConfig, err)
+    """
+    art_toml_path = art_cfg_path_from_md_path(md_file)
+    if art_toml_path.exists():
+        return ArticleConfig.loads(art_toml_path), None
+    return ArticleConfig.from_md_file(md_file, md_data, blog_cfg.title_length_max)
+
+
+def render_article_in_memory(md_file: Path, blog_cfg: BlogConfig):
+    """
+    根据 markdown 文件渲染文章，不写入任何文件（用于 boke serve）。
+
+    :return: 发生错误时返回 (err, None, None), 否则返回 (None, checksum, render)
+             其中 checksum 根据 markdown 内容、文章设定、图片的 srcset、模板及
+             markdown 转换规则的版本计算，可用作 ETag.
+             render() 返回渲染结果 (HTML), 因此 ETag 未变化时可以不渲染。
+    """
+    from . import md_render
+
+    md_data = md_file.read_bytes()
+    art_cfg, err = preview_article_config(md_file, md_data, blog_cfg)
+    if err:
+        return err, None, None
+
+    md_text = md_data.decode()
+    srcsets = None
+    if blog_cfg.img_widths:
+        images.load_state(reload=True)
+        srcsets = images.srcset_map(md_text)
+    tmpl_stats = [
+        file_stat(Templates_Folder_Path.joinpath(tmplfile[name]))
+        for name in ("article", "base")
+    ]
+    art_cfg.checksum = hashlib.sha1(md_data).hexdigest()
+    deps = [asdict(art_cfg), blog_deps(blog_cfg), tmpl_stats, srcsets, md_render.Cache_Version]
+    checksum = hashlib.sha1(json.dumps(deps, ensure_ascii=False).encode()).hexdigest()
+
+    def render():
+        html = article_html(md_file.stem, md_text, blog_cfg, art_cfg)
+        prune_md_cache()
+        return html
+
+    return None, checksum, render
+
+
+def try_add_or_update_article(
+        md_file: Path, blog_cfg: BlogConfig, force: bool, deps: str = None):
+    """
+    与 add_or_update_article() 相同，但读取文件、解析 toml 等发生的异常
+    (比如 markdown 文件不是 UTF-8 编码) 也作为 err 返回，
+    因此渲染全部文章时某篇文章出错不会中止其他文章的处理。
+    """
+    try:
+        return add_or_update_article(md_file, blog_cfg, force, deps)
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        return f"{md_file}: {type(e).__name__}: {e}", False
+
+
+def add_or_update_article(md_file: Path, blog_cfg: BlogConfig, force: bool, deps: str = None):
     """
     在渲染全部文章时，本函数处理其中一个文件。
 
+    如果 markdown 文件的大小与 mtime 都与上次记录的一致，则不读取文件内容，
+    否则才读取文件内容并通过 checksum 判断文章内容有无变化。
+    文章引用的图片的缩放结果、文章页面的模板或博客设定有变化时，
+    即使文章内容没变化也要重新渲染 html.
+
+    :param deps: article_deps(blog_cfg), 渲染全部文章时预先算好，不需要每篇文章都计算
     :return: 发生错误时返回 (str, None), 否则反回 (None, need_to_render)
     """
-    md_file_data = md_file.read_bytes()
-    art_cfg_new, err = ArticleConfig.from_md_file(
-        md_file, md_file_data, blog_cfg.title_length_max)
+    catalog = get_catalog()
+    if deps is None:
+        deps = article_deps(blog_cfg)
+    with stats.phase("scan"):
+        md_stat = file_stat(md_file)
+        images_changed = images.signatures_changed(
+            catalog.get_images(md_file.stem), bool(blog_cfg.img_widths))
+        deps_changed = catalog.get_deps(md_file.stem) != deps
+        if not force and not images_changed and not deps_changed \
+                and catalog.md_unchanged(md_file.stem, md_stat):
+            stats.count("articles_skipped_by_stat")
+            return None, False
+
+    with stats.phase("hash"):
+        md_file_data = md_file.read_bytes()
+        art_cfg_new, err = ArticleConfig.from_md_file(
+            md_file, md_file_data, blog_cfg.title_length_max)
     if err:
         return err, False
 
     art_toml_path = art_cfg_path_from_md_path(md_file)
+    with stats.phase("toml"):
+        art_cfg = catalog.get(md_file.stem)
     need_to_render = False
 
     # article toml 不存在，以 art_cfg_new 为准
-    if not art_toml_path.exists():
-        print(f"发现新文章: {art_cfg_new.title}")
+    if art_cfg is None:
+        log.info(f"发现新文章: {art_cfg_new.title}",
+                 event="new", id=md_file.stem, title=art_cfg_new.title)
         art_cfg = art_cfg_new
         need_to_render = True
     else:
         # article toml 存在，以 art_toml_path 的文件内容为准
-        art_cfg = ArticleConfig.loads(art_toml_path)
 
         # 文章内容发生了变化，自动更新 title, checksum, mtime
         if art_cfg.checksum != art_cfg_new.checksum:
-            print(f"更新: {art_cfg_new.title}")
+            log.info(f"更新: {art_cfg_new.title}",
+                     event="update", id=md_file.stem, title=art_cfg_new.title)
             art_cfg.title = art_cfg_new.title
             art_cfg.checksum = art_cfg_new.checksum
             art_cfg.mtime = model.now()
@@ -349,16 +972,22 @@ def add_or_update_article(md_file: Path, blog_cfg: BlogConfig, force: bool):
 
     # 文章内容有变化，需要渲染 toml
     if need_to_render:
-        tmpl = jinja_env.get_template(tmplfile["art_cfg"])
-        art_toml_data = tmpl.render(dict(art=art_cfg))
-        print(f"render and write {art_toml_path}")
-        art_toml_path.write_text(art_toml_data, encoding="utf-8")
+        with stats.phase("template"):
+            tmpl = get_jinja_env().get_template(tmplfile["art_cfg"])
+            art_toml_data = tmpl.render(dict(art=art_cfg))
+        writer.write_if_changed(art_toml_path, art_toml_data)
+        catalog.put(md_file.stem, art_cfg)
 
     # 需要渲染 html
-    if need_to_render or force:
+    if need_to_render or force or images_changed or deps_changed:
+        md_text = md_file_data.decode()
         html_path = html_path_from_md_path(md_file)
-        render_article_html(html_path, md_file_data.decode(), blog_cfg, art_cfg)
+        render_article_html(html_path, md_text, blog_cfg, art_cfg)
+        catalog.set_images(
+            md_file.stem, images.signatures(md_text, bool(blog_cfg.img_widths)))
+        catalog.set_deps(md_file.stem, deps)
 
+    catalog.set_md_stat(md_file.stem, md_stat)
     return None, need_to_render
 
 
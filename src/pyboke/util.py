@@ -3,13 +3,14 @@ import os
 import shutil
 from pathlib import Path
 
-from . import model
-from .model import Blog_Config_Path, CWD, Templates_Folder_Name, Articles_Folder_Path, \
+from . import model, log, writer
+from .catalog import get_catalog
+from .model import Blog_Config_Path, CWD, Articles_Folder_Path, \
     Templates_Folder_Path, Output_Folder_Path, BlogConfig, Pics_Folder_Path, RSS_Atom_XML, \
     Metadata_Folder_Path, Drafts_Folder_Path, Default_Theme_Name, Themes_Folder_Path, \
-    Theme_CSS_Path, MD_Suffix
+    Theme_CSS_Path, MD_Suffix, Package_Tmpl_Path
 from .tmpl_render import render_blog_config, tmplfile, art_cfg_path_from_md_path, \
-    html_path_from_md_path
+    html_path_from_md_path, render_css
 
 
 def dir_not_empty(path):
@@ -17,8 +18,7 @@ def dir_not_empty(path):
 
 
 def copy_templates():
-    src_folder = Path(__file__).parent.joinpath(Templates_Folder_Name)
-    shutil.copytree(src_folder, Templates_Folder_Path)
+    shutil.copytree(Package_Tmpl_Path, Templates_Folder_Path)
 
 
 def copy_static_files():
@@ -26,19 +26,19 @@ def copy_static_files():
     for src in static_files:
         if src.is_file() and src.name not in tmplfile.values():
             dst = Output_Folder_Path.joinpath(src.name)
-            print(f"Copy static file to {dst}")
-            shutil.copyfile(src, dst)
+            writer.copy_if_changed(src, dst)
     rgignore_src = Output_Folder_Path.joinpath(".rgignore")
     rgignore_dst = CWD.joinpath(".rgignore")
-    print(f"Move {rgignore_src} to {rgignore_dst}")
+    log.debug(f"Move {rgignore_src} to {rgignore_dst}",
+              event="move", src=str(rgignore_src), dst=str(rgignore_dst))
     shutil.move(rgignore_src, rgignore_dst)
 
 
 def copy_theme_css(name):
     name = name.lower()
     theme_css_file = Themes_Folder_Path.joinpath(f"{name}.css")
-    shutil.copyfile(theme_css_file, Theme_CSS_Path)
-    print(f"Using theme: {name}")
+    writer.copy_if_changed(theme_css_file, Theme_CSS_Path)
+    log.info(f"Using theme: {name}", event="theme", name=name)
 
 
 def init_blog():
@@ -59,7 +59,7 @@ def init_blog():
     copy_static_files()
     copy_theme_css(Default_Theme_Name)
     render_blog_config(BlogConfig.default())
-    print(f"请用文本编辑器打开 {Blog_Config_Path} 填写博客名称、作者名称等。")
+    log.info(f"请用文本编辑器打开 {Blog_Config_Path} 填写博客名称、作者名称等。")
     return ""
 
 
@@ -91,9 +91,15 @@ def ensure_blog_config(check_website=False):
     if cfg.home_recent_max <= 0:
         return f"请用文本编辑器打开 {Blog_Config_Path} 填写 home_recent_max, 必须大于零", None
 
-    if cfg.home_recent_max <= 0:
+    if cfg.title_length_max <= 0:
         return f"请用文本编辑器打开 {Blog_Config_Path} 填写 title_length_max, 必须大于零", None
 
+    if cfg.rss_entries_max <= 0:
+        return f"请用文本编辑器打开 {Blog_Config_Path} 填写 rss_entries_max, 必须大于零", None
+
+    if cfg.rss_content_size <= 0:
+        return f"请用文本编辑器打开 {Blog_Config_Path} 填写 rss_content_size, 必须大于零", None
+
     cfg.website = cfg.website.strip()
     if check_website:
         if cfg.website == "" or cfg.website == default_cfg.website:
@@ -154,8 +160,10 @@ def get_themes():
 
 
 def change_theme(name, blog_cfg):
-    copy_theme_css(name)
     blog_cfg.current_theme = name.lower()
+    render_css(blog_cfg)
+    get_catalog().save()
+    log.info(f"Using theme: {blog_cfg.current_theme}", event="theme", name=blog_cfg.current_theme)
     render_blog_config(blog_cfg)
 
 
@@ -167,15 +175,19 @@ def rename(old_path, new_path):
     if err := check_filename(new_path, Articles_Folder_Path, ensure_not_exist=True):
         return err
 
-    print(f"rename(md/toml/html): {old_path.stem} => {new_path.stem}")
+    log.info(f"rename(md/toml/html): {old_path.stem} => {new_path.stem}",
+             event="rename", old=old_path.stem, new=new_path.stem)
     new_md_path = Articles_Folder_Path.joinpath(new_path.name)
     old_path.rename(new_md_path)
     old_toml_path = art_cfg_path_from_md_path(old_path)
     new_toml_path = art_cfg_path_from_md_path(new_md_path)
     old_toml_path.rename(new_toml_path)
+    catalog = get_catalog()
+    catalog.rename(old_path.stem, new_md_path.stem)
+    catalog.save()
     old_html_path = html_path_from_md_path(old_path)
     new_html_path = html_path_from_md_path(new_md_path)
-    old_html_path.rename(new_html_path)
+    writer.move(old_html_path, new_html_path)
     return False
 
 
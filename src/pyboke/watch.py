@@ -0,0 +1,297 @@
+"""
+boke watch: 监视文件变化，自动渲染有变化的文章及索引页面。
+
+程序一直运行，因此 Jinja 环境、BlogConfig、catalog 都保存在内存中，
+每次只需要处理发生变化的文件。
+
+如果安装了 watchdog (pip install watchdog), 则使用系统的文件通知 (比如 inotify),
+只检查通知中的文件的 stat, 不需要扫描全部文件；
+否则定时扫描全部文件的 stat (轮询)。无论哪种方式，都以 stat 与快照的对比结果为准，
+因此本程序自己写入的文件 (toml, blog.toml 等) 不会被当作变化。
+"""
+import os
+import queue
+import time
+from pathlib import Path
+
+from . import util, log, manifest, compress, writer, images
+from .catalog import file_stat
+from .model import Articles_Folder_Path, Metadata_Folder_Path, Drafts_Folder_Path, \
+    Templates_Folder_Path, Blog_Config_Path, MD_Suffix, TOML_Suffix, CWD, Pics_Folder_Path, \
+    Resized_Folder_Path
+from .tmpl_render import add_or_update_article, blog_updated_at_now, update_index_rss, \
+    render_all_articles, preview_article, delete_articles_by_id, flush_blog_config
+
+Debounce_Seconds = 0.03
+"""使用 watchdog 时，连续收到通知的间隔小于这么多秒则合并为一次渲染"""
+
+
+def scan_files(folder: Path, suffix: str = "", recursive=False) -> dict:
+    """
+    :return: dict(path_str, [st_mtime_ns, st_size])
+    """
+    result = {}
+    try:
+        it = os.scandir(folder)
+    except FileNotFoundError:
+        return result
+    with it:
+        for entry in it:
+            if entry.is_dir():
+                if recursive:
+                    result.update(scan_files(Path(entry.path), suffix, recursive))
+                continue
+            if entry.name.endswith(suffix):
+                st = entry.stat()
+                result[entry.path] = [st.st_mtime_ns, st.st_size]
+    return result
+
+
+def take_snapshot() -> dict:
+    snapshot = {}
+    snapshot.update(scan_files(Articles_Folder_Path, MD_Suffix))
+    snapshot.update(scan_files(Metadata_Folder_Path, TOML_Suffix))
+    snapshot.update(scan_files(Drafts_Folder_Path, MD_Suffix))
+    snapshot.update(scan_files(Templates_Folder_Path, recursive=True))
+    for rel_path, st in images.find_pics():
+        snapshot[str(Pics_Folder_Path.joinpath(rel_path))] = [st.st_mtime_ns, st.st_size]
+    try:
+        st = Blog_Config_Path.stat()
+        snapshot[str(Blog_Config_Path)] = [st.st_mtime_ns, st.st_size]
+    except FileNotFoundError:
+        pass
+    return snapshot
+
+
+def diff_snapshots(old: dict, new: dict):
+    """
+    :return: (changed, removed), 都是 Path 的列表。changed 包括新增的文件。
+    """
+    changed = [Path(p) for p, stat in new.items() if old.get(p) != stat]
+    removed = [Path(p) for p in old.keys() - new.keys()]
+    return changed, removed
+
+
+def in_folder(path: Path, folder: Path) -> bool:
+    return path.parent == folder
+
+
+def is_watched(path: Path) -> bool:
+    """是否属于 take_snapshot() 的范围 (编辑器的临时文件等都不算)"""
+    if path == Blog_Config_Path or Templates_Folder_Path in path.parents:
+        return True
+    if Pics_Folder_Path in path.parents:
+        return Resized_Folder_Path not in path.parents \
+            and path.suffix.lower() in images.Image_Suffixes
+    if in_folder(path, Articles_Folder_Path) or in_folder(path, Drafts_Folder_Path):
+        return path.suffix == MD_Suffix
+    return in_folder(path, Metadata_Folder_Path) and path.suffix == TOML_Suffix
+
+
+def update_snapshot(snapshot: dict, paths):
+    """
+    只检查 paths 中的文件，并更新 snapshot.
+
+    :return: (changed, removed), 都是 Path 的列表。changed 包括新增的文件。
+    """
+    changed, removed = [], []
+    for path in paths:
+        path = Path(path)
+        if not is_watched(path):
+            continue
+        key = str(path)
+        stat = file_stat(path)
+        if stat == snapshot.get(key):
+            continue
+        if stat is None:
+            del snapshot[key]
+            removed.append(path)
+        else:
+            snapshot[key] = stat
+            changed.append(path)
+    return changed, removed
+
+
+def rebuild(changed, removed, blog_cfg):
+    """
+    根据发生变化的文件，只执行必要的渲染步骤。
+
+    :return: BlogConfig (blog.toml 有变化时会重新读取)
+    """
+    all_paths = changed + removed
+
+    # blog.toml 或模板有变化，全部重新渲染
+    force = any(
+        path == Blog_Config_Path or Templates_Folder_Path in path.parents
+        for path in all_paths
+    )
+    if Blog_Config_Path in changed:
+        err, cfg = util.ensure_blog_config()
+        if err:
+            log.error(err)
+            return blog_cfg
+        blog_cfg = cfg
+    if force:
+        if err := render_all_articles(blog_cfg, force=True):
+            log.error(f"Error: {err}")
+        return blog_cfg
+
+    # output/pics 中的图片有变化：缩放图片，并重新渲染图片的缩放结果有变化的文章
+    if blog_cfg.img_widths and any(Pics_Folder_Path in path.parents for path in all_paths):
+        if err := render_all_articles(blog_cfg, force=False):
+            log.error(f"Error: {err}")
+
+    for path in changed:
+        if in_folder(path, Drafts_Folder_Path):
+            log.info(f"Preview {path}", event="preview", path=str(path))
+            if err := preview_article(path, blog_cfg):
+                log.error(f"Error: {err}")
+
+    updated = 0
+    for path in changed:
+        if in_folder(path, Articles_Folder_Path):
+            err, need_to_render = add_or_update_article(path, blog_cfg, force=False)
+            if err:
+                log.error(f"Error: {err}")
+            if need_to_render:
+                updated += 1
+
+    # 手动修改了 toml (比如文章的 ctime), 文章页面也显示这些信息，因此需要重新渲染该文章
+    rendered = {path.stem for path in changed if in_folder(path, Articles_Folder_Path)}
+    for path in changed:
+        if not in_folder(path, Metadata_Folder_Path) or path.stem in rendered:
+            continue
+        md_file = Articles_Folder_Path.joinpath(path.stem + MD_Suffix)
+        if not md_file.exists():
+            continue
+        err, _ = add_or_update_article(md_file, blog_cfg, force=True)
+        if err:
+            log.error(f"Error: {err}")
+        updated += 1
+
+    removed_ids = [path.stem for path in removed if in_folder(path, Articles_Folder_Path)]
+    updated += delete_articles_by_id(removed_ids)
+
+    if updated > 0:
+        blog_updated_at_now(blog_cfg)
+        update_index_rss(blog_cfg)
+    elif any(in_folder(path, Metadata_Folder_Path) for path in removed):
+        update_index_rss(blog_cfg)
+
+    return blog_cfg
+
+
+def start_observer(events: queue.Queue):
+    """
+    如果安装了 watchdog, 则启动一个 Observer, 有文件变化时向 events 放入一个通知。
+
+    :return: Observer, 未安装 watchdog 时返回 None
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # 读取文件 (包括本程序自己读取文件) 也会产生通知，这些不算作变化
+            if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+                return
+            events.put(event.src_path)
+            if dest_path := getattr(event, "dest_path", ""):
+                events.put(dest_path)
+
+    handler = Handler()
+    observer = Observer()
+    observer.schedule(handler, str(Articles_Folder_Path), recursive=True)
+    observer.schedule(handler, str(Drafts_Folder_Path), recursive=False)
+    observer.schedule(handler, str(Templates_Folder_Path), recursive=True)
+    observer.schedule(handler, str(Pics_Folder_Path), recursive=True)
+    observer.schedule(handler, str(CWD), recursive=False)
+    observer.start()
+    return observer
+
+
+def wait_for_events(events: queue.Queue) -> set:
+    """
+    等待 watchdog 的通知。防抖：连续保存文件时产生的多个通知合并为一次。
+
+    :return: 通知中的文件路径
+    """
+    while True:
+        try:
+            paths = {events.get(timeout=1)}
+            break
+        except queue.Empty:
+            continue
+    while True:
+        try:
+            paths.add(events.get(timeout=Debounce_Seconds))
+        except queue.Empty:
+            return paths
+
+
+def wait_until_stable(snapshot: dict, interval: float) -> dict:
+    """轮询时的防抖：连续保存文件时，等待文件停止变化后才返回最终的快照。"""
+    while True:
+        time.sleep(interval)
+        new_snapshot = take_snapshot()
+        if new_snapshot == snapshot:
+            return snapshot
+        snapshot = new_snapshot
+
+
+def wait_for_change(snapshot: dict, events: queue.Queue, interval: float, use_events: bool):
+    """
+    使用 watchdog 时只检查通知中的文件，否则每隔 interval 秒扫描全部文件。
+    snapshot 会被更新为最新的状态。
+
+    :return: (changed, removed)
+    """
+    if use_events:
+        return update_snapshot(snapshot, wait_for_events(events))
+    time.sleep(interval)
+    new_snapshot = take_snapshot()
+    if new_snapshot == snapshot:
+        return [], []
+    new_snapshot = wait_until_stable(new_snapshot, interval)
+    changed, removed = diff_snapshots(snapshot, new_snapshot)
+    snapshot.clear()
+    snapshot.update(new_snapshot)
+    return changed, removed
+
+
+def watch_blog(blog_cfg, interval: float = 0.5):
+    events = queue.Queue()
+    observer = start_observer(events)
+    mode = "watchdog" if observer else f"polling every {interval}s"
+    log.info(f"Watching {CWD} ({mode}), press Ctrl-C to stop.")
+    log.flush()
+
+    flush_blog_config()
+    # 只在启动时扫描一次全部文件 (轮询时则每次都扫描)
+    snapshot = take_snapshot()
+    try:
+        while True:
+            changed, removed = wait_for_change(
+                snapshot, events, interval, observer is not None)
+            if not changed and not removed:
+                continue
+            start = time.perf_counter()
+            blog_cfg = rebuild(changed, removed, blog_cfg)
+            flush_blog_config()
+            compress.compress_changes()
+            own_files = writer.changes.written | writer.changes.removed
+            manifest.record_build()
+            elapsed = (time.perf_counter() - start) * 1000
+            log.info(f"Rebuilt in {elapsed:.0f} ms", event="rebuild", ms=round(elapsed))
+            log.flush()
+            # 渲染过程中本程序自己写入的文件 (toml, blog.toml) 记入快照，不算作变化
+            update_snapshot(snapshot, own_files)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()
@@ -0,0 +1,144 @@
+"""
+统一的文件写入
+
+- 内容与已有文件完全相同时不写入 (不改变 mtime, 部署工具就不会重新上传)。
+- 先写临时文件再改名 (os.replace), 避免写到一半被中断而留下残缺的文件。
+- 记录本次命令写入、删除了哪些文件，命令结束时由 manifest.record_build() 处理。
+"""
+import os
+from pathlib import Path
+
+from . import log
+from .model import Output_Folder_Path
+from .stats import stats
+
+# 注意: writer.py 只能 import model.py, log.py, stats.py
+
+
+class Changes:
+    """本进程写入、删除的文件"""
+
+    def __init__(self):
+        self.written = set()
+        self.removed = set()
+
+    def add(self, path):
+        path = str(path)
+        self.written.add(path)
+        self.removed.discard(path)
+
+    def remove(self, path):
+        path = str(path)
+        self.removed.add(path)
+        self.written.discard(path)
+
+    def take(self):
+        """取出并清空目前的记录 (用于子进程把记录交给主进程)"""
+        data = (self.written, self.removed)
+        self.written, self.removed = set(), set()
+        return data
+
+    def merge(self, data):
+        written, removed = data
+        for path in written:
+            self.add(path)
+        for path in removed:
+            self.remove(path)
+
+
+changes = Changes()
+
+
+def temp_path_for(path: Path) -> Path:
+    # 包含进程号，多个进程同时写入同一个文件也不会冲突
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def write_if_changed(path: Path, data) -> bool:
+    """
+    :param data: str 或 bytes (str 以 utf-8 编码)
+    :return: 是否写入了文件
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with stats.phase("write"):
+        try:
+            if path.read_bytes() == data:
+                stats.count("files_unchanged")
+                return False
+        except FileNotFoundError:
+            pass
+        log.debug(f"render and write {path}", event="write", path=str(path))
+        temp_path = temp_path_for(path)
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+        stats.count("files_written")
+        changes.add(path)
+        return True
+
+
+def stream_write_if_changed(path: Path, stream) -> bool:
+    """
+    把 Jinja 的 TemplateStream 逐段写入临时文件，不需要在内存中生成整个字符串。
+    如果与原文件内容相同则丢弃临时文件，否则用临时文件替换原文件。
+
+    :return: 是否写入了文件
+    """
+    temp_path = temp_path_for(path)
+    # 模板的渲染与写入交替进行，无法分开计时，因此都算作 template
+    with stats.phase("template"):
+        stream.dump(str(temp_path), encoding="utf-8")
+    with stats.phase("write"):
+        if files_equal(temp_path, path):
+            temp_path.unlink()
+            stats.count("files_unchanged")
+            return False
+        log.debug(f"render and write {path}", event="write", path=str(path))
+        os.replace(temp_path, path)
+        stats.count("files_written")
+        changes.add(path)
+        return True
+
+
+def files_equal(path_a: Path, path_b: Path) -> bool:
+    try:
+        if path_a.stat().st_size != path_b.stat().st_size:
+            return False
+    except FileNotFoundError:
+        return False
+    return path_a.read_bytes() == path_b.read_bytes()
+
+
+def copy_if_changed(src: Path, dst: Path) -> bool:
+    return write_if_changed(dst, src.read_bytes())
+
+
+def remove(path: Path, missing_ok=False):
+    path.unlink(missing_ok=missing_ok)
+    changes.remove(path)
+
+
+def move(src: Path, dst: Path):
+    src.rename(dst)
+    changes.remove(src)
+    changes.add(dst)
+
+
+def output_relative(paths) -> list:
+    """只保留 output 文件夹中的文件，返回相对于 output 的路径 (用 / 分隔)"""
+    result = []
+    for path in paths:
+        path = Path(path)
+        if Output_Folder_Path in path.parents:
+            result.append(path.relative_to(Output_Folder_Path).as_posix())
+    return sorted(result)
+
+
+def take_output_changes():
+    """
+    取出并清空本进程的记录，只保留 output 文件夹中的文件。
+
+    :return: (written, removed), 都是相对于 output 的路径的列表
+    """
+    written, removed = changes.take()
+    return output_relative(written), output_relative(removed)
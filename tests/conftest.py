@@ -0,0 +1,13 @@
+"""
+让测试可以直接 import pyboke (不需要先安装)。
+
+注意 pyboke.model 的路径取决于 import 时的工作目录，
+因此直接 import 的测试需要用 monkeypatch 把模块中的路径改为临时文件夹。
+"""
+import sys
+from pathlib import Path
+
+Src_Path = Path(__file__).resolve().parent.parent.joinpath("src")
+
+if str(Src_Path) not in sys.path:
+    sys.path.insert(0, str(Src_Path))
@@ -0,0 +1,69 @@
+"""
+旧博客的 templates/blog.toml 缺少新增的项目时，写入 blog.toml 不可丢失这些设定。
+
+每个测试都在临时文件夹中执行 boke 命令 (子进程), 因为 pyboke.model 的路径取决于工作目录。
+"""
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+Src_Path = Path(__file__).resolve().parent.parent.joinpath("src")
+
+Boke_Command = [sys.executable, "-c", "from pyboke.main import cli; cli()"]
+
+New_Settings = dict(
+    split_listing=True,
+    rss_entries_max=3,
+    rss_content_size=64,
+    img_widths=[480],
+    precompress=True,
+    minify=True,
+)
+"""旧版本的 templates/blog.toml 中没有的项目，及本测试设定的值"""
+
+
+def boke(blog_dir: Path, *args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Src_Path), env.get("PYTHONPATH")]))
+    return subprocess.run(
+        Boke_Command + list(args), cwd=blog_dir, env=env,
+        capture_output=True, text=True, check=True)
+
+
+def toml_value(value) -> str:
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def test_old_template_keeps_new_settings(tmp_path):
+    boke(tmp_path, "init")
+
+    # 模拟旧版本的模板：删除新增项目所在的行
+    old_tmpl = tmp_path.joinpath("templates", "blog.toml")
+    pattern = re.compile(rf"^({'|'.join(New_Settings)}) = .*\n", re.MULTILINE)
+    old_tmpl.write_text(pattern.sub("", old_tmpl.read_text(encoding="utf-8")), encoding="utf-8")
+
+    blog_toml = tmp_path.joinpath("blog.toml")
+    text = blog_toml.read_text(encoding="utf-8")
+    text = text.replace("在此填写博客名称", "Test Blog").replace("在此填写作者名称", "Tester")
+    for key, value in New_Settings.items():
+        text = re.sub(rf"^{key} = .*$", f"{key} = {toml_value(value)}", text, flags=re.MULTILINE)
+    blog_toml.write_text(text, encoding="utf-8")
+
+    tmp_path.joinpath("articles", "hello.md").write_text("# Hello\n\nworld\n", encoding="utf-8")
+    result = boke(tmp_path, "render", "-all")
+    assert "split_listing" in result.stderr + result.stdout  # 提示模板是旧版本
+
+    cfg = tomllib.loads(blog_toml.read_text(encoding="utf-8"))
+    assert cfg["name"] == "Test Blog"
+    assert cfg["blog_updated"] > ""
+    for key, value in New_Settings.items():
+        assert cfg[key] == value, key
@@ -0,0 +1,112 @@
+"""catalog.json 只是 toml 文件的缓存：toml 有变化或版本不一致时必须重新读取。"""
+import json
+import os
+
+import pytest
+
+from pyboke import catalog, tmpl_render
+
+
+def toml_text(title: str, checksum: str = "abc", ctime: str = "2024-01-02 03:04:05+08:00") -> str:
+    return (
+        f'title = "{title}"\nauthor = ""\nctime = "{ctime}"\nmtime = "{ctime}"\n'
+        f'checksum = "{checksum}"\nignored = false\nimg_width = ""\nreplace = 0\npairs = []\n'
+    )
+
+
+@pytest.fixture
+def metadata(tmp_path, monkeypatch):
+    """把 catalog 模块的路径改为临时文件夹，并清空进程内共用的 Catalog"""
+    folder = tmp_path.joinpath("articles", "metadata")
+    folder.mkdir(parents=True)
+    monkeypatch.setattr(catalog, "Metadata_Folder_Path", folder)
+    monkeypatch.setattr(catalog, "Catalog_Path", folder.joinpath("catalog.json"))
+    monkeypatch.setattr(catalog, "_catalog", None)
+    return folder
+
+
+def write_toml(folder, art_id, text, mtime_ns=None):
+    path = folder.joinpath(art_id + ".toml")
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def titles(articles) -> dict:
+    return {art.id: art.title for art in articles}
+
+
+def test_sync_reads_new_and_removes_deleted(metadata):
+    write_toml(metadata, "a", toml_text("A"))
+    write_toml(metadata, "b", toml_text("B"))
+    cat = catalog.Catalog.load().sync()
+    assert titles(cat.articles()) == {"a": "A", "b": "B"}
+
+    metadata.joinpath("b.toml").unlink()
+    assert titles(cat.sync().articles()) == {"a": "A"}
+
+
+def test_edited_toml_is_reloaded(metadata):
+    path = write_toml(metadata, "a", toml_text("Old"), mtime_ns=1_000_000_000)
+    cat = catalog.Catalog.load().sync()
+    cat.save()
+    assert cat.get("a").title == "Old"
+
+    # 大小相同，只有 mtime 不同
+    write_toml(metadata, "a", toml_text("New"), mtime_ns=2_000_000_000)
+    assert path.stat().st_size == len(toml_text("Old"))
+    assert catalog.Catalog.load().sync().articles()[0].title == "New"
+    assert cat.get("a").title == "New"
+
+
+def test_unchanged_toml_is_not_reread(metadata, monkeypatch):
+    write_toml(metadata, "a", toml_text("A"))
+    catalog.Catalog.load().sync().save()
+
+    def fail(file):
+        raise AssertionError(f"不应读取 {file}")
+
+    monkeypatch.setattr(catalog.ArticleConfig, "loads", fail)
+    cat = catalog.Catalog.load().sync()
+    assert titles(cat.articles()) == {"a": "A"}
+    assert not cat.changed
+
+
+def test_get_all_articles_picks_up_edit(metadata):
+    write_toml(metadata, "a", toml_text("First"), mtime_ns=1_000_000_000)
+    assert titles(tmpl_render.get_all_articles()) == {"a": "First"}
+
+    write_toml(metadata, "a", toml_text("Second title"), mtime_ns=2_000_000_000)
+    assert titles(tmpl_render.get_all_articles()) == {"a": "Second title"}
+
+    saved = json.loads(catalog.Catalog_Path.read_text(encoding="utf-8"))
+    assert saved["articles"]["a"]["art"]["title"] == "Second title"
+
+
+def test_version_mismatch_discards_cache(metadata):
+    write_toml(metadata, "a", toml_text("A"))
+    catalog.Catalog.load().sync().save()
+
+    data = json.loads(catalog.Catalog_Path.read_text(encoding="utf-8"))
+    data["articles"]["a"]["art"]["title"] = "Stale"
+    data["version"] = catalog.Catalog_Version + 1
+    catalog.Catalog_Path.write_text(json.dumps(data), encoding="utf-8")
+
+    cat = catalog.Catalog.load()
+    assert cat.entries == {}
+    assert titles(cat.sync().articles()) == {"a": "A"}
+
+
+def test_corrupt_catalog_is_rebuilt(metadata):
+    write_toml(metadata, "a", toml_text("A"))
+    catalog.Catalog_Path.write_text("{not json", encoding="utf-8")
+    assert titles(catalog.Catalog.load().sync().articles()) == {"a": "A"}
+
+
+def test_broken_toml_is_reported_not_raised(metadata):
+    write_toml(metadata, "a", toml_text("A"))
+    write_toml(metadata, "b", 'title = "unterminated\n')
+    cat = catalog.Catalog.load().sync()
+    assert titles(cat.articles()) == {"a": "A"}
+    assert len(cat.errors) == 1 and "b.toml" in cat.errors[0]
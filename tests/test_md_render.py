@@ -0,0 +1,75 @@
+"""md_render 的 pairs 替换结果必须与原来的做法 (逐对 str.replace 后用 mistune.html 渲染) 相同。"""
+import mistune
+import pytest
+
+from pyboke import md_render
+
+
+def baseline_html(md_text: str, pairs: list) -> str:
+    for old, new in pairs:
+        md_text = md_text.replace(old, new, 1)
+    return mistune.html(md_text)
+
+
+Image_Pair = ["../output/pics/abc.jpg", "https://example.com/pics/abc.jpg"]
+
+Cases = {
+    "no pairs": ("# Title\n\n~~del~~ text[^1]\n\n[^1]: note\n", []),
+    "image and link": (
+        "![photo](../output/pics/abc.jpg)\n\n[home](https://a.com)\n",
+        [Image_Pair, ["https://a.com", "https://b.com"]],
+    ),
+    "key in code block first": (
+        "```\n![photo](../output/pics/abc.jpg)\n```\n\n![photo](../output/pics/abc.jpg)\n",
+        [Image_Pair],
+    ),
+    "key in inline code first": (
+        "Use `../output/pics/abc.jpg` like this: ![photo](../output/pics/abc.jpg)\n",
+        [Image_Pair],
+    ),
+    "key in code block after image": (
+        "![photo](../output/pics/abc.jpg)\n\n    ../output/pics/abc.jpg\n",
+        [Image_Pair],
+    ),
+    "same image twice": (
+        "![a](../output/pics/abc.jpg)\n\n![b](../output/pics/abc.jpg)\n",
+        [Image_Pair],
+    ),
+    "plain text": ("foo bar foo\n\n| a | b |\n|---|---|\n| foo | x |\n", [["foo", "baz"]]),
+    "chained pairs": ("alpha beta\n", [["alpha", "gamma"], ["gamma", "delta"]]),
+    "same key twice": ("x x x\n", [["x", "1"], ["x", "2"]]),
+    "missing key": ("nothing here\n", [["absent", "x"]]),
+    "longer key after prefix": ("abcd abc\n", [["abc", "X"], ["abcd", "Y"]]),
+}
+
+
+@pytest.mark.parametrize("md_text, pairs", Cases.values(), ids=Cases.keys())
+def test_pairs_same_as_baseline(md_text, pairs):
+    assert md_render.markdown_to_html(md_text, pairs) == baseline_html(md_text, pairs)
+
+
+def test_replace_first():
+    text, replaced = md_render.replace_first("a b a", [["a", "c"], ["z", "y"], ["b", "d"]])
+    assert text == "c d a"
+    assert replaced == {"c": "a", "d": "b"}
+
+
+Srcsets = {"../output/pics/abc.jpg": [["resized/abc-1-480.jpg", 480], ["abc.jpg", 1200]]}
+
+
+def test_srcset_without_pairs():
+    html = md_render.markdown_to_html("![p](../output/pics/abc.jpg)\n", [], Srcsets, "pics/")
+    assert 'srcset="pics/resized/abc-1-480.jpg 480w, pics/abc.jpg 1200w"' in html
+
+
+def test_srcset_follows_replaced_url():
+    html = md_render.markdown_to_html(
+        "![p](../output/pics/abc.jpg)\n", [Image_Pair], Srcsets, "pics/")
+    assert 'src="https://example.com/pics/abc.jpg"' in html
+    assert "https://example.com/pics/resized/abc-1-480.jpg 480w" in html
+
+
+def test_no_srcset_when_replaced_elsewhere():
+    pairs = [["../output/pics/abc.jpg", "https://example.com/other.jpg"]]
+    html = md_render.markdown_to_html("![p](../output/pics/abc.jpg)\n", pairs, Srcsets, "pics/")
+    assert "srcset" not in html
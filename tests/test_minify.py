@@ -0,0 +1,60 @@
+"""minify_html() 与 minify_css() 只压缩空白，不能改变显示效果。"""
+import pytest
+
+from pyboke.minify import minify_css, minify_html
+
+
+@pytest.mark.parametrize("element", [
+    "<pre>  line 1\n\n    indented   line\n</pre>",
+    '<pre class="x"><code>def f():\n    return  1\n</code></pre>',
+    "<textarea name=t>  keep\n   these   spaces </textarea>",
+    "<script>\nif (a  <  b) {\n    s = '  x  ';\n}\n</script>",
+    "<SCRIPT type=\"module\">\n  let  x = 1;\n</SCRIPT>",
+    "<code>a   b</code>",
+])
+def test_preserved_elements_unchanged(element):
+    html = f"<div>\n    <p>before</p>\n    {element}\n    <p>after</p>\n</div>"
+    result = minify_html(html)
+    assert element in result
+    assert "    <p>" not in result
+
+
+def test_space_between_inline_elements():
+    # 行内元素之间的空白会显示为一个空格，不能删除
+    assert minify_html("<p><b>a</b>   <i>b</i> <a href=x>c</a></p>") == \
+        "<p><b>a</b> <i>b</i> <a href=x>c</a></p>\n"
+    # 包含换行的空白压缩为一个换行 (显示效果与空格相同)
+    assert minify_html("<p><b>a</b>\n   \n  <i>b</i></p>") == "<p><b>a</b>\n<i>b</i></p>\n"
+    # 原本没有空白的地方不能加入空白
+    assert minify_html("<p><b>a</b><i>b</i>c</p>") == "<p><b>a</b><i>b</i>c</p>\n"
+
+
+def test_text_and_tags():
+    html = '  <p   class="a  b"\n   id=x>Hello,    world!</p>  \n\n'
+    assert minify_html(html) == '<p class="a  b" id=x>Hello, world!</p>\n'
+
+
+def test_style_element_is_minified_as_css():
+    html = "<style>\n  img {\n    max-width: 100% ;\n  }\n</style>"
+    assert minify_html(html) == "<style>img{max-width:100%}</style>\n"
+
+
+def test_minify_css():
+    css = """
+    /* 注释 */
+    a:hover ,  p > b {
+        color : red ;
+        font-family: "Open  Sans", serif;
+    }
+    div :first-child { content: '  /* x */  '; }
+    """
+    assert minify_css(css) == (
+        'a:hover,p>b{color:red;font-family:"Open  Sans",serif}'
+        "div :first-child{content:'  /* x */  '}"
+    )
+
+
+def test_minify_is_idempotent():
+    html = "<div>\n  <p>a  <b>b</b>\n c</p>\n  <pre> x  y </pre>\n</div>\n"
+    once = minify_html(html)
+    assert minify_html(once) == once
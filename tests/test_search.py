@@ -0,0 +1,116 @@
+"""搜索索引：切分规则，以及 delta 增量更新与重新生成全部索引的结果一致。"""
+import json
+from dataclasses import dataclass
+
+import pytest
+
+from pyboke import search
+
+
+@dataclass
+class Art:
+    """只包含 search 用到的项目的文章记录"""
+    id: str
+    title: str
+    checksum: str
+    ignored: bool = False
+
+
+def test_tokenize_mixed_cjk_ascii():
+    tokens = search.tokenize("用Python写博客, 版本3.11!")
+    assert tokens == {"用", "python", "写博", "博客", "客", "版本", "本", "3", "11"}
+
+
+def test_tokenize_lowercase_and_long_word():
+    word = "A" * (search.Word_Length_Max + 10)
+    assert search.tokenize(f"Hello WORLD {word}") == {
+        "hello", "world", "a" * search.Word_Length_Max}
+
+
+def test_tokenize_japanese_korean():
+    assert search.tokenize("ひらがな 한국") == {"ひら", "らが", "がな", "な", "한국", "국"}
+
+
+def test_query_terms_prefix():
+    assert search.query_terms("Py 中 中文") == [
+        ("py", True), ("中", True), ("中文", False)]
+
+
+@pytest.fixture
+def blog(tmp_path, monkeypatch):
+    """把 search 模块的路径改为临时文件夹，返回写入文章的函数"""
+    articles = tmp_path.joinpath("articles")
+    articles.mkdir()
+    monkeypatch.setattr(search, "Articles_Folder_Path", articles)
+    monkeypatch.setattr(search, "Search_Folder_Path", tmp_path.joinpath("output", "search"))
+    monkeypatch.setattr(search, "Search_State_Path", tmp_path.joinpath(".boke-cache", "search.json"))
+    tmp_path.joinpath("output").mkdir()
+
+    def write(art_id, title, body):
+        articles.joinpath(art_id + ".md").write_text(body, encoding="utf-8")
+        return Art(art_id, title, checksum=str(hash((title, body))))
+
+    return write
+
+
+def effective_index() -> dict:
+    """读取 output/search 中的文件，返回 dict(token, set(id)), 即 (主索引 - stale) + delta"""
+    folder = search.Search_Folder_Path
+    delta = json.loads(folder.joinpath(search.Delta_Name).read_text(encoding="utf-8"))
+    stale = set(delta["stale"])
+    index = {}
+    for n in range(search.Shards):
+        shard = json.loads(search.shard_path(n).read_text(encoding="utf-8"))
+        for token, ids in shard.items():
+            index.setdefault(token, set()).update(set(ids) - stale)
+    for token, ids in delta["tokens"].items():
+        index.setdefault(token, set()).update(ids)
+    return {token: ids for token, ids in index.items() if ids}
+
+
+def full_rebuild(articles) -> dict:
+    search.Search_State_Path.unlink()
+    search.update_index(articles)
+    return effective_index()
+
+
+@pytest.mark.parametrize("many", [False, True], ids=["delta", "merged"])
+def test_delta_equals_rebuild(blog, many):
+    arts = [blog(f"a{i}", f"标题{i}", f"正文 word{i} 共同内容") for i in range(5)]
+    assert search.update_index(arts) == 5
+
+    # 修改、改名、删除、新增；many 为真时新增的文章超过 Delta_Max, 触发合并
+    arts[0] = blog("a0", "标题0", "改写后的正文 changed")
+    renamed = blog("b1", arts[1].title, "正文 word1 共同内容")
+    arts[1] = renamed
+    del arts[2]
+    extra = search.Delta_Max + 1 if many else 3
+    arts += [blog(f"n{i}", f"新文章{i}", f"新增 extra{i}") for i in range(extra)]
+
+    search.update_index(arts)
+    incremental = effective_index()
+    delta = json.loads(search.Search_Folder_Path.joinpath(search.Delta_Name).read_text(encoding="utf-8"))
+    assert (delta["tokens"] == {}) == many
+
+    assert incremental == full_rebuild(arts)
+    assert "a2" not in set().union(*incremental.values())
+    assert incremental["changed"] == {"a0"}
+
+
+def test_unchanged_articles_not_reindexed(blog):
+    arts = [blog(f"a{i}", f"标题{i}", f"正文{i}") for i in range(3)]
+    search.update_index(arts)
+    assert search.update_index(arts) == 0
+
+
+def test_search_delta_and_stale(blog):
+    arts = [blog("a", "Python 入门", "学习编程"), blog("b", "博客", "静态网站")]
+    search.update_index(arts)
+    arts[0] = blog("a", "Python 入门", "改为其他内容")
+    search.update_index(arts)
+
+    assert search.search("py") == (None, [["a", "Python 入门"]])
+    assert search.search("编程") == (None, [])
+    assert search.search("网站") == (None, [["b", "博客"]])
+    err, _ = search.search("!!")
+    assert err